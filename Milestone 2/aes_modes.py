@@ -0,0 +1,63 @@
+import os
+
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+from cryptography.hazmat.primitives import padding
+from cryptography.hazmat.backends import default_backend
+
+from cipher_cache import GCM_SALT_SIZE
+
+# The AES primitives behind /encrypt and /decrypt. key is a
+# cipher_cache.PreparedKey. Importing this module has no side effects, so
+# benchmarks can use it without starting the app.
+AES_MODES = ["CBC", "GCM", "CTR"]
+
+# GCM ciphertext = salt | nonce | encrypted data | tag, sealed with the
+# subkey of the salt (see cipher_cache.PreparedKey.gcm_sealer)
+GCM_NONCE_SIZE = 12
+GCM_TAG_SIZE = 16
+
+def encrypt_aes_bytes(key, data, mode="CBC"):
+    if mode == "GCM":
+        salt, aesgcm = key.gcm_sealer()
+        nonce = os.urandom(GCM_NONCE_SIZE)
+        return salt + nonce + aesgcm.encrypt(nonce, data, None)
+
+    if mode == "CTR":
+        nonce = os.urandom(16)
+        encryptor = Cipher(key.aes, modes.CTR(nonce), backend=default_backend()).encryptor()
+        return nonce + encryptor.update(data) + encryptor.finalize()
+
+    iv = os.urandom(16)
+    cipher = Cipher(key.aes, modes.CBC(iv), backend=default_backend())
+
+    pkcs7_padder = padding.PKCS7(algorithms.AES.block_size).padder()
+    padded_plaintext = pkcs7_padder.update(data) + pkcs7_padder.finalize()
+    encryptor = cipher.encryptor()
+    cipher_text = encryptor.update(padded_plaintext) + encryptor.finalize()
+    return iv + cipher_text
+
+def decrypt_aes_bytes(key, data, mode="CBC"):
+    if mode == "GCM":
+        header_size = GCM_SALT_SIZE + GCM_NONCE_SIZE
+        if len(data) >= header_size + GCM_TAG_SIZE:
+            try:
+                return key.gcm_opener(data[:GCM_SALT_SIZE]).decrypt(
+                    data[GCM_SALT_SIZE:header_size], data[header_size:], None)
+            except InvalidTag:
+                pass
+        # Ciphertexts from before the subkeys: nonce | data | tag under the stored key
+        nonce, encrypted_data = data[:GCM_NONCE_SIZE], data[GCM_NONCE_SIZE:]
+        return key.aesgcm.decrypt(nonce, encrypted_data, None)
+
+    if mode == "CTR":
+        nonce, encrypted_data = data[:16], data[16:]
+        decryptor = Cipher(key.aes, modes.CTR(nonce), backend=default_backend()).decryptor()
+        return decryptor.update(encrypted_data) + decryptor.finalize()
+
+    iv, encrypted_data = data[:16], data[16:]
+    cipher = Cipher(key.aes, modes.CBC(iv), backend=default_backend())
+    decryptor = cipher.decryptor()
+    padded_data = decryptor.update(encrypted_data) + decryptor.finalize()
+    unpadder = padding.PKCS7(algorithms.AES.block_size).unpadder()
+    return unpadder.update(padded_data) + unpadder.finalize()
@@ -0,0 +1,99 @@
+import hashlib
+import json
+import os
+import threading
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SPEC_SOURCE = os.path.join(BASE_DIR, "swagger.yml")
+SPEC_CACHE = os.path.join(BASE_DIR, "swagger.json")
+
+# URLs served by flasgger's default configuration
+DOCS_PREFIXES = ("/apidocs", "/apispec_1.json", "/flasgger_static")
+
+def read_source():
+    with open(SPEC_SOURCE, "rb") as f:
+        return f.read()
+
+def parse_spec(source):
+    import yaml
+    return yaml.safe_load(source)
+
+def write_spec_cache(spec, digest):
+    # Written to a temporary file and renamed, so a worker starting at the
+    # same time never reads a half-written cache
+    tmp_path = f"{SPEC_CACHE}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, "w") as f:
+            json.dump({"source_sha256": digest, "spec": spec}, f)
+        os.replace(tmp_path, SPEC_CACHE)
+    except OSError:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def compile_spec():
+    source = read_source()
+    spec = parse_spec(source)
+    write_spec_cache(spec, hashlib.sha256(source).hexdigest())
+    return spec
+
+def load_spec():
+    # Use the compiled JSON unless swagger.yml changed since it was written
+    source = read_source()
+    digest = hashlib.sha256(source).hexdigest()
+    try:
+        with open(SPEC_CACHE) as f:
+            cached = json.load(f)
+        if cached.get("source_sha256") == digest:
+            return cached["spec"]
+    except (OSError, ValueError):
+        pass
+    spec = parse_spec(source)
+    try:
+        write_spec_cache(spec, digest)
+    except OSError:
+        pass  # Read-only filesystem: serve the freshly parsed spec
+    return spec
+
+def create_swagger(app):
+    from flasgger import Swagger
+    return Swagger(app, template=load_spec())
+
+class LazyDocs:
+    # WSGI wrapper that builds the Swagger UI on the first request for one of
+    # its URLs, so workers that never serve docs never import flasgger
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+        self.docs_app = None
+        self.lock = threading.Lock()
+
+    def get_docs_app(self):
+        if self.docs_app is None:
+            with self.lock:
+                if self.docs_app is None:
+                    from flask import Flask
+                    docs_app = Flask(__name__)
+                    create_swagger(docs_app)
+                    self.docs_app = docs_app
+        return self.docs_app
+
+    def __call__(self, environ, start_response):
+        if environ.get("PATH_INFO", "").startswith(DOCS_PREFIXES):
+            return self.get_docs_app()(environ, start_response)
+        return self.wsgi_app(environ, start_response)
+
+def install_docs(app, mode):
+    # eager: register the docs at import time
+    # lazy:  register them on the first /apidocs request
+    # off:   no docs (production)
+    if mode == "eager":
+        return create_swagger(app)
+    if mode == "lazy":
+        app.wsgi_app = LazyDocs(app.wsgi_app)
+    elif mode != "off":
+        raise ValueError(f"Unknown SWAGGER_MODE {mode!r}")
+    return None
+
+if __name__ == '__main__':
+    compile_spec()
+    print(f"Compiled {SPEC_SOURCE} to {SPEC_CACHE}")
@@ -1,139 +1,604 @@
-from flask import Flask, request, jsonify, redirect
+from flask import Flask, Request, request, jsonify, redirect, Response, stream_with_context
 import base64
 import os
-import hashlib
+import hmac
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from cryptography.exceptions import InvalidTag
 from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
 from cryptography.hazmat.primitives import padding
 from cryptography.hazmat.backends import default_backend
-from flasgger import Swagger
 import bcrypt
+import math
+import multiprocessing
+from werkzeug.middleware.proxy_fix import ProxyFix
+
+import aes_modes
+from aes_modes import AES_MODES
+from api_docs import install_docs
+from bcrypt_cost import BCRYPT_LATENCY_BUDGET_MS, load_bcrypt_cost
+from chunked_aead import CHUNK_SIZE, ChunkedAEAD
+from cipher_cache import CipherCache
+from hashing import HASH_ALGORITHMS
+from key_pool import KEY_SIZES, KeyPool, generate_keys
+from key_store import create_key_store
+from metrics import Metrics, instrument_app
+from profiling import install_profiling
+from rate_limit import TokenBucketLimiter
+from security_events import SecurityEvents, create_attack_detector
+from user_store import create_user_store, pack_hash, unpack_hash, record_cost
+from wire_format import (JSON_MIMETYPE, BINARY_MIMETYPE, read_envelope, invalid_body, response_mimetype,
+                         as_bytes, binary_value, encode_response)
+
+metrics = Metrics(os.environ.get("METRICS_DIR"))
+
+class TimedRequest(Request):
+    def get_json(self, *args, **kwargs):
+        with metrics.timer("json_parse"):
+            return super().get_json(*args, **kwargs)
 
 app = Flask(__name__)
-swagger = Swagger(app, template_file="swagger.yml")
+app.request_class = TimedRequest
+instrument_app(app, metrics)
+install_profiling(app)
+# Behind a reverse proxy the client IP is only in X-Forwarded-For
+if os.environ.get("TRUSTED_PROXIES"):
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=int(os.environ["TRUSTED_PROXIES"]))
+swagger = install_docs(app, os.environ.get("SWAGGER_MODE", "eager"))
+
+security_events = SecurityEvents(create_attack_detector(), metrics)
 
-keys = {}
+keys = create_key_store()
+ciphers = CipherCache(keys)
+key_pool = KeyPool(keys)
+chunked_aead = ChunkedAEAD()
+
+MAX_BATCH_SIZE = int(os.environ.get("MAX_BATCH_SIZE", 1000))
+STREAM_CHUNK_SIZE = int(os.environ.get("STREAM_CHUNK_SIZE", 64 * 1024))
 
 @app.route('/')
 def home():
     return redirect('/apidocs')
 
-def generate_aes_key(key_size):
-    key = os.urandom(key_size // 8)
-    return base64.b64encode(key).decode('utf-8')
-
 @app.route('/generate-key', methods=['POST'])
 def generate_key():
     data = request.json
     key_type = data.get('key_type')
     key_size = data.get('key_size')
     
-    if key_type != "AES" or key_size not in [128, 192, 256]:
+    if key_type != "AES" or key_size not in KEY_SIZES:
         return jsonify({"error": "Invalid key type or size"}), 400
     
-    key_id = str(len(keys) + 1)
-    key_value = generate_aes_key(key_size)
-    keys[key_id] = base64.b64decode(key_value)
+    pooled = key_pool.take(key_size)
+    if pooled:
+        key_id, key = pooled
+    else:
+        key = generate_keys(key_size, 1)[0]
+        key_id = keys.add(key)
     
-    return jsonify({"key_id": key_id, "key_value": key_value})
+    return jsonify({"key_id": key_id, "key_value": base64.b64encode(key).decode('utf-8')})
 
-def encrypt_aes(key, plaintext):
-    iv = os.urandom(16)
-    cipher = Cipher(algorithms.AES(key), modes.CBC(iv), backend=default_backend())
+@app.route('/generate-key/batch', methods=['POST'])
+def generate_key_batch():
+    data = request.json
+    key_type = data.get('key_type')
+    key_size = data.get('key_size')
+    count = data.get('count')
 
-    pkcs7_padder = padding.PKCS7(algorithms.AES.block_size).padder()
-    padded_plaintext = pkcs7_padder.update(plaintext.encode()) + pkcs7_padder.finalize()
-    encryptor = cipher.encryptor()
-    cipher_text = encryptor.update(padded_plaintext) + encryptor.finalize()
-    return base64.b64encode(iv + cipher_text).decode('utf-8')
+    if key_type != "AES" or key_size not in KEY_SIZES:
+        return jsonify({"error": "Invalid key type or size"}), 400
+    if not isinstance(count, int) or count < 1:
+        return jsonify({"error": "count must be a positive integer"}), 400
+    if count > MAX_BATCH_SIZE:
+        return jsonify({"error": f"Batch size exceeds the limit of {MAX_BATCH_SIZE} keys"}), 413
+
+    new_keys = generate_keys(key_size, count)
+    key_ids = keys.add_many(new_keys)
+    return jsonify({"keys": [{"key_id": key_id, "key_value": base64.b64encode(key).decode('utf-8')}
+                             for key_id, key in zip(key_ids, new_keys)]})
+
+# Each primitive is timed once, under the name /metrics reports: the bytes
+# functions do the AES work for every route, the str wrappers only add base64
+encrypt_aes_bytes = metrics.timed("encrypt_aes")(aes_modes.encrypt_aes_bytes)
+decrypt_aes_bytes = metrics.timed("decrypt_aes")(aes_modes.decrypt_aes_bytes)
+
+def encrypt_aes(key, plaintext, mode="CBC"):
+    return base64.b64encode(encrypt_aes_bytes(key, plaintext.encode(), mode)).decode('utf-8')
 
 @app.route('/encrypt', methods=['POST'])
 def encrypt():
-    data = request.json
+    data = read_envelope('plaintext', ['key_id', 'device_id', 'algorithm', 'mode'])
+    if data is None:
+        return invalid_body()
     key_id = data.get('key_id')
     plaintext = data.get('plaintext')
     algorithm = data.get('algorithm')
+    mode = data.get('mode', "CBC")
     
-    if key_id not in keys or algorithm != "AES":
+    key = ciphers.get(key_id, data.get('device_id'))
+    if key is None or algorithm != "AES":
         return jsonify({"error": "Invalid key or algorithm"}), 400
-    
-    ciphertext = encrypt_aes(keys[key_id], plaintext)
-    return jsonify({"ciphertext": ciphertext})
 
-def decrypt_aes(key, ciphertext):
-    decoded = base64.b64decode(ciphertext)
-    iv, encrypted_data = decoded[:16], decoded[16:]
-    cipher = Cipher(algorithms.AES(key), modes.CBC(iv), backend=default_backend())
-    decryptor = cipher.decryptor()
-    padded_data = decryptor.update(encrypted_data) + decryptor.finalize()
-    unpadder = padding.PKCS7(algorithms.AES.block_size).unpadder()
-    plaintext = unpadder.update(padded_data) + unpadder.finalize()
+    if mode not in AES_MODES:
+        return jsonify({"error": "Invalid mode"}), 400
+
+    mimetype = response_mimetype()
+    if mimetype == JSON_MIMETYPE and isinstance(plaintext, str):
+        ciphertext = encrypt_aes(key, plaintext, mode)
+        return jsonify({"ciphertext": ciphertext})
+
+    plaintext = as_bytes(plaintext)
+    if plaintext is None:
+        return jsonify({"error": "plaintext must be a string"}), 400
+    ciphertext = encrypt_aes_bytes(key, plaintext, mode)
+    return encode_response({"ciphertext": ciphertext}, mimetype, ciphertext)
+
+def get_batch_items(data):
+    items = data.get('items') if isinstance(data, dict) else None
+    if not isinstance(items, list) or not items:
+        return None, (jsonify({"error": "items must be a non-empty list"}), 400)
+    if len(items) > MAX_BATCH_SIZE:
+        return None, (jsonify({"error": f"Batch size exceeds the limit of {MAX_BATCH_SIZE} items"}), 413)
+    return items, None
+
+@app.route('/encrypt/batch', methods=['POST'])
+def encrypt_batch():
+    items, error = get_batch_items(request.json)
+    if error:
+        return error
+
+    results = []
+    for item in items:
+        if not isinstance(item, dict):
+            results.append({"error": "Invalid item"})
+            continue
+        key_id = item.get('key_id')
+        plaintext = item.get('plaintext')
+        mode = item.get('mode', "CBC")
+        key = ciphers.get(key_id, item.get('device_id'))
+        if key is None or item.get('algorithm') != "AES":
+            results.append({"error": "Invalid key or algorithm"})
+        elif mode not in AES_MODES:
+            results.append({"error": "Invalid mode"})
+        elif not isinstance(plaintext, str):
+            results.append({"error": "plaintext must be a string"})
+        else:
+            results.append({"ciphertext": encrypt_aes(key, plaintext, mode)})
+
+    return jsonify({"results": results})
+
+def decrypt_aes(key, ciphertext, mode="CBC"):
+    plaintext = decrypt_aes_bytes(key, base64.b64decode(ciphertext), mode)
     return plaintext.decode('utf-8').strip()
 
 @app.route('/decrypt', methods=['POST'])
 def decrypt():
-    data = request.json
+    data = read_envelope('ciphertext', ['key_id', 'device_id', 'algorithm', 'mode'])
+    if data is None:
+        return invalid_body()
     key_id = data.get('key_id')
     ciphertext = data.get('ciphertext')
     algorithm = data.get('algorithm')
+    mode = data.get('mode', "CBC")
     
-    if key_id not in keys or algorithm != "AES":
+    key = ciphers.get(key_id, data.get('device_id'))
+    if key is None or algorithm != "AES":
         return jsonify({"error": "Invalid key or algorithm"}), 400
+
+    if mode not in AES_MODES:
+        return jsonify({"error": "Invalid mode"}), 400
     
-    plaintext = decrypt_aes(keys[key_id], ciphertext)
-    return jsonify({"plaintext": plaintext})
-
-def comput_hash(data, algorithm="SHA-256"):
-    if algorithm == "SHA-256":
-        hash_value = hashlib.sha256(data.encode()).digest()
-    elif algorithm == "SHA-512":
-        hash_value = hashlib.sha512(data.encode()).digest()
-    else:
+    mimetype = response_mimetype()
+    try:
+        if mimetype == JSON_MIMETYPE and isinstance(ciphertext, str):
+            return jsonify({"plaintext": decrypt_aes(key, ciphertext, mode)})
+
+        plaintext = decrypt_aes_bytes(key, binary_value(ciphertext), mode)
+        if mimetype == JSON_MIMETYPE:
+            return jsonify({"plaintext": plaintext.decode('utf-8').strip()})
+    except (ValueError, TypeError, InvalidTag):
+        return jsonify({"error": "Invalid ciphertext"}), 400
+    return encode_response({"plaintext": plaintext}, mimetype, plaintext)
+
+@app.route('/decrypt/batch', methods=['POST'])
+def decrypt_batch():
+    items, error = get_batch_items(request.json)
+    if error:
+        return error
+
+    results = []
+    for item in items:
+        if not isinstance(item, dict):
+            results.append({"error": "Invalid item"})
+            continue
+        key_id = item.get('key_id')
+        ciphertext = item.get('ciphertext')
+        mode = item.get('mode', "CBC")
+        key = ciphers.get(key_id, item.get('device_id'))
+        if key is None or item.get('algorithm') != "AES":
+            results.append({"error": "Invalid key or algorithm"})
+            continue
+        if mode not in AES_MODES:
+            results.append({"error": "Invalid mode"})
+            continue
+        try:
+            results.append({"plaintext": decrypt_aes(key, ciphertext, mode)})
+        except (ValueError, TypeError, InvalidTag):
+            results.append({"error": "Invalid ciphertext"})
+
+    return jsonify({"results": results})
+
+def read_chunks(stream, chunk_size=STREAM_CHUNK_SIZE):
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        yield chunk
+
+def encrypt_aes_stream(key, chunks):
+    iv = os.urandom(16)
+    cipher = Cipher(key.aes, modes.CBC(iv), backend=default_backend())
+    pkcs7_padder = padding.PKCS7(algorithms.AES.block_size).padder()
+    encryptor = cipher.encryptor()
+
+    yield iv
+    for chunk in chunks:
+        out = encryptor.update(pkcs7_padder.update(chunk))
+        # An empty chunk would terminate a chunked response early
+        if out:
+            yield out
+    yield encryptor.update(pkcs7_padder.finalize()) + encryptor.finalize()
+
+def decrypt_aes_stream(key, iv, chunks):
+    cipher = Cipher(key.aes, modes.CBC(iv), backend=default_backend())
+    decryptor = cipher.decryptor()
+    unpadder = padding.PKCS7(algorithms.AES.block_size).unpadder()
+
+    try:
+        for chunk in chunks:
+            out = unpadder.update(decryptor.update(chunk))
+            if out:
+                yield out
+        out = unpadder.update(decryptor.finalize()) + unpadder.finalize()
+    except ValueError as e:
+        # The 200 status is already sent. Re-raising makes the server drop the
+        # connection before the final chunk, so the client sees a broken
+        # transfer instead of a complete response.
+        app.logger.warning("Invalid ciphertext in /decrypt/stream: %s", e)
+        raise
+    if out:
+        yield out
+
+@app.route('/encrypt/stream', methods=['POST'])
+def encrypt_stream():
+    key_id = request.args.get('key_id')
+    algorithm = request.args.get('algorithm')
+
+    key = ciphers.get(key_id, request.args.get('device_id'))
+    if key is None or algorithm != "AES":
+        return jsonify({"error": "Invalid key or algorithm"}), 400
+
+    chunks = read_chunks(request.stream)
+    return Response(stream_with_context(encrypt_aes_stream(key, chunks)),
+                    mimetype='application/octet-stream')
+
+@app.route('/decrypt/stream', methods=['POST'])
+def decrypt_stream():
+    key_id = request.args.get('key_id')
+    algorithm = request.args.get('algorithm')
+
+    key = ciphers.get(key_id, request.args.get('device_id'))
+    if key is None or algorithm != "AES":
+        return jsonify({"error": "Invalid key or algorithm"}), 400
+
+    # An IV and at least one whole block; a bad length is caught before the
+    # response starts when the client sends Content-Length
+    length = request.content_length
+    if length is not None and (length < 32 or length % 16):
+        return jsonify({"error": "Invalid ciphertext"}), 400
+    iv = request.stream.read(16)
+    if len(iv) != 16:
+        return jsonify({"error": "Invalid ciphertext"}), 400
+
+    chunks = read_chunks(request.stream)
+    return Response(stream_with_context(decrypt_aes_stream(key, iv, chunks)),
+                    mimetype='application/octet-stream')
+
+def buffer_response(buffer):
+    # WSGI servers only accept bytes, and copying a large buffer in one go is
+    # slow, so it is sent in STREAM_CHUNK_SIZE pieces
+    view = memoryview(buffer)
+    chunks = (bytes(view[start:start + STREAM_CHUNK_SIZE]) for start in range(0, len(view), STREAM_CHUNK_SIZE))
+    return Response(chunks, mimetype='application/octet-stream', headers={"Content-Length": str(len(view))})
+
+@app.route('/encrypt/chunked', methods=['POST'])
+def encrypt_chunked():
+    key_id = request.args.get('key_id')
+    algorithm = request.args.get('algorithm')
+
+    key = ciphers.get(key_id, request.args.get('device_id'))
+    if key is None or algorithm != "AES":
+        return jsonify({"error": "Invalid key or algorithm"}), 400
+
+    chunk_size = request.args.get('chunk_size', str(CHUNK_SIZE))
+    if not chunk_size.isdigit():
+        return jsonify({"error": "Invalid chunk_size"}), 400
+
+    try:
+        with metrics.timer("encrypt_chunked"):
+            ciphertext = chunked_aead.encrypt(key.key, request.get_data(), int(chunk_size))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return buffer_response(ciphertext)
+
+@app.route('/decrypt/chunked', methods=['POST'])
+def decrypt_chunked():
+    key_id = request.args.get('key_id')
+    algorithm = request.args.get('algorithm')
+
+    key = ciphers.get(key_id, request.args.get('device_id'))
+    if key is None or algorithm != "AES":
+        return jsonify({"error": "Invalid key or algorithm"}), 400
+
+    try:
+        with metrics.timer("decrypt_chunked"):
+            plaintext = chunked_aead.decrypt(key.key, request.get_data())
+    except (ValueError, InvalidTag):
+        return jsonify({"error": "Invalid ciphertext"}), 400
+    return buffer_response(plaintext)
+
+@metrics.timed("comput_hash")
+def comput_digest(data, algorithm="SHA-256"):
+    if algorithm not in HASH_ALGORITHMS:
         return None
-    
-    return base64.b64encode(hash_value).decode('utf-8')
+
+    return HASH_ALGORITHMS[algorithm](data).digest()
+
+@metrics.timed("comput_hash")
+def comput_digest_stream(chunks, algorithm="SHA-256"):
+    if algorithm not in HASH_ALGORITHMS:
+        return None
+
+    hasher = HASH_ALGORITHMS[algorithm]()
+    for chunk in chunks:
+        hasher.update(chunk)
+    return hasher.digest()
+
+def digests_match(digest, given_hash):
+    # Constant-time comparison of the decoded digests, so the response time
+    # does not reveal how many leading bytes of a guessed hash were right
+    try:
+        given_digest = binary_value(given_hash)
+    except ValueError:
+        return False
+    return hmac.compare_digest(digest, given_digest)
+
+def is_stream_request():
+    return request.mimetype == BINARY_MIMETYPE
 
 @app.route('/generate-hash', methods=['POST'])
 def generate_hash_api():
-    data = request.json
-    text = data.get('data')
-    algorithm = data.get('algorithm', "SHA-256")
-    
-    hash_value = comput_hash(text, algorithm)
+    # A raw body is hashed in chunks as it arrives, with the algorithm in the query string
+    if is_stream_request():
+        algorithm = request.args.get('algorithm', "SHA-256")
+        hash_value = comput_digest_stream(read_chunks(request.stream), algorithm)
+    else:
+        data = read_envelope()
+        if data is None:
+            return invalid_body()
+        text = as_bytes(data.get('data'))
+        algorithm = data.get('algorithm', "SHA-256")
+        if text is None:
+            return jsonify({"error": "data must be a string"}), 400
+        hash_value = comput_digest(text, algorithm)
+
     if hash_value is None:
         return jsonify({"error": "Invalid hashing algorithm"}), 400
     
-    return jsonify({"hash_value": hash_value, "algorithm": algorithm})
+    return encode_response({"hash_value": hash_value, "algorithm": algorithm},
+                           response_mimetype(raw_default=False), hash_value)
 
 
 @app.route('/verify-hash', methods=['POST'])
 def verify_hash():
-    data = request.json
-    message = data.get("data")
-    given_hash = data.get("hash_value")
-    algorithm = data.get("algorithm")
+    if is_stream_request():
+        given_hash = request.headers.get("X-Hash-Value", request.args.get("hash_value"))
+        algorithm = request.args.get("algorithm")
+    else:
+        data = read_envelope()
+        if data is None:
+            return invalid_body()
+        message = as_bytes(data.get("data"))
+        given_hash = data.get("hash_value")
+        algorithm = data.get("algorithm")
+        if message is None:
+            return jsonify({"error": "data must be a string"}), 400
 
-    if algorithm not in ["SHA-256", "SHA-512"]:
+    if algorithm not in HASH_ALGORITHMS:
         return jsonify({"error": "Unsupported hashing algorithm"}), 400
 
-    computed_hash = comput_hash(message, algorithm)
+    if is_stream_request():
+        computed_hash = comput_digest_stream(read_chunks(request.stream), algorithm)
+    else:
+        computed_hash = comput_digest(message, algorithm)
 
-    if computed_hash == given_hash:
-        return jsonify({"is_valid": True, "message": "Hash matches the data."})
+    mimetype = response_mimetype(raw_default=False)
+    if digests_match(computed_hash, given_hash):
+        return encode_response({"is_valid": True, "message": "Hash matches the data."}, mimetype, b"\x01")
     else:
-        return jsonify({"is_valid": False, "message": "Hash does not match."})
+        return encode_response({"is_valid": False, "message": "Hash does not match."}, mimetype, b"\x00")
+
+# hashlib releases the GIL while hashing, so large batch items are hashed on a
+# thread pool while the small ones are handled inline
+HASH_WORKERS = int(os.environ.get("HASH_WORKERS", os.cpu_count() or 1))
+PARALLEL_HASH_MIN_SIZE = int(os.environ.get("PARALLEL_HASH_MIN_SIZE", 64 * 1024))
+hash_pool = ThreadPoolExecutor(max_workers=HASH_WORKERS)
+
+@app.route('/verify-hash/batch', methods=['POST'])
+def verify_hash_batch():
+    data = request.json
+    items, error = get_batch_items(data)
+    if error:
+        return error
+    default_algorithm = data.get("algorithm")
+
+    # Bit i of the bitmap (least significant bit first) is set when item i matches
+    bitmap = bytearray((len(items) + 7) // 8)
+    errors = []
+    pending = []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict) or not isinstance(item.get("data"), str):
+            errors.append({"index": index, "error": "Invalid item"})
+            continue
+        algorithm = item.get("algorithm", default_algorithm)
+        if algorithm not in HASH_ALGORITHMS:
+            errors.append({"index": index, "error": "Unsupported hashing algorithm"})
+            continue
+
+        message = item["data"].encode()
+        if len(message) >= PARALLEL_HASH_MIN_SIZE:
+            pending.append((index, item, hash_pool.submit(comput_digest, message, algorithm)))
+        elif digests_match(comput_digest(message, algorithm), item.get("hash_value")):
+            bitmap[index >> 3] |= 1 << (index & 7)
+
+    for index, item, future in pending:
+        if digests_match(future.result(), item.get("hash_value")):
+            bitmap[index >> 3] |= 1 << (index & 7)
+
+    response = {
+        "count": len(items),
+        "valid_count": sum(bin(byte).count("1") for byte in bitmap),
+        "valid": base64.b64encode(bytes(bitmap)).decode('utf-8'),
+    }
+    if errors:
+        response["errors"] = errors
+    return jsonify(response)
+
+users = create_user_store()
+
+# bcrypt runs in a separate process pool so a burst of logins cannot hold the
+# request threads. BCRYPT_WORKERS=0 hashes inline on the request thread instead.
+BCRYPT_WORKERS = int(os.environ.get("BCRYPT_WORKERS", os.cpu_count() or 1))
+BCRYPT_QUEUE_SIZE = int(os.environ.get("BCRYPT_QUEUE_SIZE", 4 * max(BCRYPT_WORKERS, 1)))
+BCRYPT_RETRY_AFTER = int(os.environ.get("BCRYPT_RETRY_AFTER", 1))
+# Forking a worker that already runs threads can deadlock the child on a lock
+# another thread held, so the pool processes come from a fork server, or are
+# spawned where there is none
+BCRYPT_START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+bcrypt_slots = threading.BoundedSemaphore(BCRYPT_WORKERS + BCRYPT_QUEUE_SIZE)
+bcrypt_pool = None
+bcrypt_pool_pid = None
+bcrypt_pool_lock = threading.Lock()
+
+class BcryptPoolFull(Exception):
+    pass
+
+def get_bcrypt_pool():
+    global bcrypt_pool, bcrypt_pool_pid
+    # gunicorn forks its workers after importing the app, so every worker
+    # process has to start its own pool
+    if bcrypt_pool_pid != os.getpid():
+        with bcrypt_pool_lock:
+            if bcrypt_pool_pid != os.getpid():
+                bcrypt_pool = ProcessPoolExecutor(max_workers=BCRYPT_WORKERS,
+                                                  mp_context=multiprocessing.get_context(BCRYPT_START_METHOD))
+                bcrypt_pool_pid = os.getpid()
+    return bcrypt_pool
 
-keys = {}
-users = {}  
+def discard_bcrypt_pool(pool):
+    global bcrypt_pool_pid
+    with bcrypt_pool_lock:
+        # Another thread may have replaced it already
+        if bcrypt_pool is pool:
+            bcrypt_pool_pid = None
+    pool.shutdown(wait=False)
 
+def run_bcrypt(fn, *args):
+    if BCRYPT_WORKERS <= 0:
+        return fn(*args)
+
+    if not bcrypt_slots.acquire(blocking=False):
+        raise BcryptPoolFull()
+    try:
+        # A pool whose process died (for example to the OOM killer) fails
+        # every later call, so it is replaced and the call retried once
+        for _ in range(2):
+            pool = get_bcrypt_pool()
+            try:
+                return pool.submit(fn, *args).result()
+            except BrokenProcessPool:
+                app.logger.warning("bcrypt pool broken, starting a new one")
+                discard_bcrypt_pool(pool)
+        raise BcryptPoolFull()
+    finally:
+        bcrypt_slots.release()
+
+@app.errorhandler(BcryptPoolFull)
+def bcrypt_pool_full(error):
+    response = jsonify({"error": "Server is busy, please retry later"})
+    response.status_code = 503
+    response.headers["Retry-After"] = str(BCRYPT_RETRY_AFTER)
+    return response
+
+bcrypt_cost, bcrypt_cost_ms = load_bcrypt_cost()
+
+@metrics.timed("hash_password")
 def hash_password(password):
-    salt = bcrypt.gensalt()
-    hashed = bcrypt.hashpw(password.encode(), salt)
-    return base64.b64encode(salt + hashed).decode('utf-8')
+    salt = bcrypt.gensalt(bcrypt_cost)
+    return pack_hash(run_bcrypt(bcrypt.hashpw, password.encode(), salt))
 
+@metrics.timed("verify_password")
 def verify_password(password, stored_hash):
-    decoded = base64.b64decode(stored_hash)
-    salt, stored_hashed_password = decoded[:29], decoded[29:]
-    return bcrypt.checkpw(password.encode(), stored_hashed_password)
+    return run_bcrypt(bcrypt.checkpw, password.encode(), unpack_hash(stored_hash))
+
+# Hashes made with a lower cost than the current one are replaced after a
+# successful login, off the request path. Queued rehashes hold plaintext
+# passwords, so at most REHASH_QUEUE_SIZE of them wait; the others are
+# skipped and retried on a later login.
+REHASH_QUEUE_SIZE = int(os.environ.get("REHASH_QUEUE_SIZE", 100))
+rehash_executor = ThreadPoolExecutor(max_workers=1)
+rehash_slots = threading.BoundedSemaphore(max(REHASH_QUEUE_SIZE, 1))
+rehash_count = 0
+
+def schedule_rehash(username, password, stored_hash):
+    if REHASH_QUEUE_SIZE <= 0 or not rehash_slots.acquire(blocking=False):
+        return
+    rehash_executor.submit(rehash_password, username, password, stored_hash)
+
+def rehash_password(username, password, stored_hash):
+    global rehash_count
+    try:
+        new_hash = hash_password(password)
+    except BcryptPoolFull:
+        return  # Try again on the next login
+    finally:
+        rehash_slots.release()
+    # Skip the update if the password changed while we were hashing
+    if users.replace(username, stored_hash, new_hash):
+        rehash_count += 1
+
+# Login attempts are throttled per username and per client IP before any
+# bcrypt work is done. A rate of 0 disables the limit.
+login_user_limiter = TokenBucketLimiter(
+    rate=float(os.environ.get("LOGIN_RATE_PER_USER", 0.2)),
+    burst=int(os.environ.get("LOGIN_BURST_PER_USER", 5)),
+)
+login_ip_limiter = TokenBucketLimiter(
+    rate=float(os.environ.get("LOGIN_RATE_PER_IP", 1)),
+    burst=int(os.environ.get("LOGIN_BURST_PER_IP", 20)),
+)
+
+def throttle_login(username):
+    for limiter, key in ((login_ip_limiter, request.remote_addr), (login_user_limiter, username)):
+        allowed, retry_after = limiter.allow(key)
+        if not allowed:
+            response = jsonify({"message": "Too many login attempts"})
+            response.status_code = 429
+            response.headers["Retry-After"] = str(math.ceil(retry_after))
+            return response
+    return None
 
 @app.route('/register', methods=['POST'])
 def register():
@@ -147,7 +612,8 @@ def register():
     if username in users:
         return jsonify({"error": "Username already exists"}), 409
     
-    users[username] = hash_password(password)
+    if not users.add(username, hash_password(password)):
+        return jsonify({"error": "Username already exists"}), 409
     return jsonify({"message": "User registered successfully"}),201
 
 @app.route('/login', methods=['POST'])
@@ -156,14 +622,46 @@ def login():
     username = data.get('username')
     password = data.get('password')
     
-    if username not in users:
+    throttled = throttle_login(username)
+    if throttled:
+        return throttled
+
+    stored_hash = users.get(username)
+    if stored_hash is None:
+        security_events.record("login_failed", username, request.remote_addr)
         return jsonify({"message": "User not found"}), 404
     
-    if verify_password(password, users[username]):
+    if verify_password(password, stored_hash):
+        if record_cost(stored_hash) < bcrypt_cost:
+            schedule_rehash(username, password, stored_hash)
+        security_events.record("user_login", username, request.remote_addr, {"ip_address": request.remote_addr})
         return jsonify({"message": "Correct password. Login Sucessful"}), 200
     else:
+        security_events.record("login_failed", username, request.remote_addr)
         return jsonify({"message": "Incorrect password"}), 401
 
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/status', methods=['GET'])
+def status():
+    return jsonify({
+        "bcrypt": {
+            "cost": bcrypt_cost,
+            "cost_ms": bcrypt_cost_ms,
+            "latency_budget_ms": BCRYPT_LATENCY_BUDGET_MS,
+            "rehashed_passwords": rehash_count,
+        },
+        "cipher_cache": ciphers.stats(),
+        "key_pool": key_pool.stats(),
+        "security_events": security_events.stats(),
+        "login_throttle": {
+            "per_user": login_user_limiter.stats(),
+            "per_ip": login_ip_limiter.stats(),
+        },
+    })
+
 if __name__ == '__main__':
     # port = int(os.environ.get("PORT", 5000))
     # app.run(host="0.0.0.0", port=port, debug=True)
@@ -0,0 +1,90 @@
+import argparse
+import json
+import os
+import time
+
+import bcrypt
+
+try:
+    import fcntl
+except ImportError:  # Not on Windows, where workers may calibrate at the same time
+    fcntl = None
+
+# The bcrypt cost is the largest one whose hash time on this host fits in
+# BCRYPT_LATENCY_BUDGET_MS, never going below BCRYPT_MIN_COST. Setting
+# BCRYPT_COST skips the calibration.
+BCRYPT_LATENCY_BUDGET_MS = float(os.environ.get("BCRYPT_LATENCY_BUDGET_MS", 250))
+BCRYPT_MIN_COST = int(os.environ.get("BCRYPT_MIN_COST", 10))
+BCRYPT_MAX_COST = int(os.environ.get("BCRYPT_MAX_COST", 16))
+BCRYPT_COST_FILE = os.environ.get("BCRYPT_COST_FILE", "bcrypt_cost.json")
+
+def time_bcrypt(cost):
+    start = time.perf_counter()
+    bcrypt.hashpw(b"calibration", bcrypt.gensalt(cost))
+    return (time.perf_counter() - start) * 1000
+
+def calibrate_bcrypt_cost():
+    cost = BCRYPT_MIN_COST
+    elapsed_ms = time_bcrypt(cost)
+    # Every extra round doubles the work, so stop as soon as the next one
+    # cannot fit in the budget
+    while cost < BCRYPT_MAX_COST and elapsed_ms * 2 <= BCRYPT_LATENCY_BUDGET_MS:
+        next_elapsed_ms = time_bcrypt(cost + 1)
+        if next_elapsed_ms > BCRYPT_LATENCY_BUDGET_MS:
+            break
+        cost += 1
+        elapsed_ms = next_elapsed_ms
+    return cost, elapsed_ms
+
+def calibration_settings():
+    return {"latency_budget_ms": BCRYPT_LATENCY_BUDGET_MS, "min_cost": BCRYPT_MIN_COST, "max_cost": BCRYPT_MAX_COST}
+
+def read_cost_file(path):
+    # Returns (cost, cost_ms), or None if the file is missing or was
+    # calibrated with other settings
+    try:
+        with open(path) as f:
+            saved = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(saved, dict) or saved.get("settings") != calibration_settings():
+        return None
+    if not isinstance(saved.get("cost"), int):
+        return None
+    return saved["cost"], saved.get("cost_ms")
+
+def save_calibration(path):
+    cost, cost_ms = calibrate_bcrypt_cost()
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"cost": cost, "cost_ms": cost_ms, "settings": calibration_settings()}, f)
+    os.replace(tmp_path, path)
+    return cost, cost_ms
+
+def load_bcrypt_cost(path=BCRYPT_COST_FILE):
+    # Every gunicorn worker must use the same cost, or logins that land on
+    # different workers keep rehashing each other's hashes. The first worker
+    # to start calibrates and saves the result in `path` while holding a
+    # lock; the others, and later restarts, read the saved cost.
+    if os.environ.get("BCRYPT_COST"):
+        return int(os.environ["BCRYPT_COST"]), None
+
+    saved = read_cost_file(path)
+    if saved:
+        return saved
+    try:
+        with open(f"{path}.lock", "a") as lock:
+            if fcntl:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            return read_cost_file(path) or save_calibration(path)
+    except OSError:
+        # Read-only filesystem: this worker keeps its own result
+        return calibrate_bcrypt_cost()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Calibrate the bcrypt cost on this host and save it for the workers")
+    parser.add_argument("--file", default=BCRYPT_COST_FILE, help="where the workers read the cost from")
+    args = parser.parse_args()
+
+    cost, cost_ms = save_calibration(args.file)
+    print(f"bcrypt cost {cost} ({cost_ms:.1f} ms) saved to {args.file}")
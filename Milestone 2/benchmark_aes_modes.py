@@ -0,0 +1,63 @@
+import argparse
+import json
+import os
+import time
+
+from aes_modes import AES_MODES, encrypt_aes_bytes, decrypt_aes_bytes
+from cipher_cache import PreparedKey
+from key_pool import KEY_SIZES
+
+PAYLOAD_SIZES = [64, 4 * 1024, 1024 * 1024]
+
+def measure(fn, key, data, mode, min_time):
+    # Repeat until min_time has elapsed so small payloads get a stable figure
+    iterations = 0
+    start = time.perf_counter()
+    elapsed = 0.0
+    while elapsed < min_time:
+        fn(key, data, mode)
+        iterations += 1
+        elapsed = time.perf_counter() - start
+    return iterations * len(data) / elapsed
+
+def run(payload_sizes, min_time):
+    results = []
+    for key_size in KEY_SIZES:
+        key = PreparedKey(os.urandom(key_size // 8))
+        for size in payload_sizes:
+            plaintext = os.urandom(size)
+            for mode in AES_MODES:
+                ciphertext = encrypt_aes_bytes(key, plaintext, mode)
+                results.append({
+                    "key_size": key_size,
+                    "mode": mode,
+                    "payload_bytes": size,
+                    "encrypt_bytes_per_sec": measure(encrypt_aes_bytes, key, plaintext, mode, min_time),
+                    "decrypt_bytes_per_sec": measure(decrypt_aes_bytes, key, ciphertext, mode, min_time),
+                })
+    return results
+
+def print_table(results):
+    print(f"{'key':>4} {'payload':>9} {'mode':>4} {'encrypt MB/s':>13} {'decrypt MB/s':>13} {'vs CBC':>7}")
+    cbc = {(r["key_size"], r["payload_bytes"]): r["encrypt_bytes_per_sec"]
+           for r in results if r["mode"] == "CBC"}
+    for r in results:
+        speedup = r["encrypt_bytes_per_sec"] / cbc[(r["key_size"], r["payload_bytes"])]
+        print(f"{r['key_size']:>4} {r['payload_bytes']:>9} {r['mode']:>4} "
+              f"{r['encrypt_bytes_per_sec'] / 1e6:>13.1f} {r['decrypt_bytes_per_sec'] / 1e6:>13.1f} "
+              f"{speedup:>6.2f}x")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compare AES-CBC, AES-GCM and AES-CTR throughput")
+    parser.add_argument("--sizes", type=int, nargs="+", default=PAYLOAD_SIZES,
+                        help="payload sizes in bytes")
+    parser.add_argument("--min-time", type=float, default=0.5,
+                        help="seconds to spend on each measurement")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    args = parser.parse_args()
+
+    results = run(args.sizes, args.min_time)
+    print_table(results)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,75 @@
+import argparse
+import json
+import os
+import time
+
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+from chunked_aead import CHUNK_SIZE, ChunkedAEAD
+
+PAYLOAD_SIZES = [16 * 1024 * 1024, 128 * 1024 * 1024]
+
+def worker_counts():
+    counts = [1]
+    while counts[-1] * 2 <= 2 * (os.cpu_count() or 1):
+        counts.append(counts[-1] * 2)
+    return counts
+
+def measure(fn, data, min_time):
+    # Repeat until min_time has elapsed and report the best run
+    best = None
+    start = time.perf_counter()
+    while best is None or time.perf_counter() - start < min_time:
+        run_start = time.perf_counter()
+        fn(data)
+        elapsed = time.perf_counter() - run_start
+        best = elapsed if best is None else min(best, elapsed)
+    return len(data) / best
+
+def run(payload_sizes, workers, chunk_size, min_time):
+    key = AESGCM.generate_key(256)
+    aesgcm = AESGCM(key)
+    results = []
+    for size in payload_sizes:
+        plaintext = os.urandom(size)
+        # One AES-GCM call over the whole buffer, the /encrypt GCM path
+        single = measure(lambda data: aesgcm.encrypt(os.urandom(12), data, None), plaintext, min_time)
+        for count in workers:
+            chunked = ChunkedAEAD(workers=count)
+            ciphertext = chunked.encrypt(key, plaintext, chunk_size)
+            results.append({
+                "payload_bytes": size,
+                "workers": count,
+                "chunk_size": chunk_size,
+                "single_call_bytes_per_sec": single,
+                "encrypt_bytes_per_sec": measure(lambda data: chunked.encrypt(key, data, chunk_size),
+                                                 plaintext, min_time),
+                "decrypt_bytes_per_sec": measure(lambda data: chunked.decrypt(key, data),
+                                                 ciphertext, min_time),
+            })
+    return results
+
+def print_table(results):
+    print(f"{'payload MB':>10} {'workers':>7} {'encrypt MB/s':>13} {'decrypt MB/s':>13} {'vs 1 call':>9}")
+    for r in results:
+        speedup = r["encrypt_bytes_per_sec"] / r["single_call_bytes_per_sec"]
+        print(f"{r['payload_bytes'] / 2 ** 20:>10.0f} {r['workers']:>7} "
+              f"{r['encrypt_bytes_per_sec'] / 1e6:>13.1f} {r['decrypt_bytes_per_sec'] / 1e6:>13.1f} "
+              f"{speedup:>8.2f}x")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Chunked AES-GCM throughput by number of worker threads")
+    parser.add_argument("--sizes", type=int, nargs="+", default=PAYLOAD_SIZES, help="payload sizes in bytes")
+    parser.add_argument("--workers", type=int, nargs="+", default=worker_counts(),
+                        help="thread counts to measure (default: powers of two up to twice the cores)")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="chunk size in bytes")
+    parser.add_argument("--min-time", type=float, default=1.0, help="seconds to spend on each measurement")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    args = parser.parse_args()
+
+    print(f"{os.cpu_count()} CPU cores")
+    results = run(args.sizes, args.workers, args.chunk_size, args.min_time)
+    print_table(results)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
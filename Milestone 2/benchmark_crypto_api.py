@@ -0,0 +1,311 @@
+import argparse
+import base64
+import itertools
+import json
+import os
+import platform
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import yaml
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PAYLOAD_SIZES = [64, 4 * 1024, 64 * 1024]
+CONCURRENCY = [1, 4, 16]
+BATCH_ITEMS = 100
+
+class InProcessClient:
+    # Drives the app through the Flask test client, one client per thread
+    def __init__(self):
+        # Login throttling would otherwise reject most of the benchmark traffic
+        os.environ.setdefault("LOGIN_RATE_PER_USER", "0")
+        os.environ.setdefault("LOGIN_RATE_PER_IP", "0")
+        import app as crypto_app
+        self.app = crypto_app.app
+        self.local = threading.local()
+        self.target = "in-process"
+
+    def request(self, method, path, json=None, data=None, headers=None):
+        client = getattr(self.local, "client", None)
+        if client is None:
+            client = self.local.client = self.app.test_client()
+        response = client.open(path, method=method, json=json, data=data, headers=headers)
+        return response.status_code, response.get_data()
+
+class HTTPClient:
+    # Drives a running server, e.g. a local `gunicorn app:app`
+    def __init__(self, url):
+        import requests
+        self.requests = requests
+        self.url = url.rstrip("/")
+        self.local = threading.local()
+        self.target = self.url
+
+    def request(self, method, path, json=None, data=None, headers=None):
+        session = getattr(self.local, "session", None)
+        if session is None:
+            session = self.local.session = self.requests.Session()
+        response = session.request(method, self.url + path, json=json, data=data, headers=headers)
+        return response.status_code, response.content
+
+def request_json(client, method, path, body):
+    status, content = client.request(method, path, json=body)
+    if status >= 400:
+        raise RuntimeError(f"Setup request {path} failed with {status}: {content[:200]!r}")
+    return json.loads(content)
+
+class Scenarios:
+    # One request factory per route in swagger.yml. Each factory takes the
+    # payload size and returns (method, path, keyword arguments).
+    def __init__(self, client, sizes):
+        self.client = client
+        self.key_id = request_json(client, "POST", "/generate-key",
+                                   {"key_type": "AES", "key_size": 256})["key_id"]
+        self.password = "benchmark-password"
+        self.username = f"bench-{os.getpid()}-{time.time_ns()}"
+        request_json(client, "POST", "/register", {"username": self.username, "password": self.password})
+        self.usernames = itertools.count()
+
+        self.texts = {}
+        self.ciphertexts = {}
+        self.raw_ciphertexts = {}
+        self.chunked_ciphertexts = {}
+        self.hashes = {}
+        for size in sizes:
+            text = "x" * size
+            self.texts[size] = text
+            self.ciphertexts[size] = request_json(client, "POST", "/encrypt", {
+                "key_id": self.key_id, "plaintext": text, "algorithm": "AES"})["ciphertext"]
+            self.raw_ciphertexts[size] = base64.b64decode(self.ciphertexts[size])
+            _, self.chunked_ciphertexts[size] = client.request(
+                "POST", f"/encrypt/chunked?key_id={self.key_id}&algorithm=AES", data=text.encode(),
+                headers={"Content-Type": "application/octet-stream"})
+            self.hashes[size] = request_json(client, "POST", "/generate-hash", {
+                "data": text, "algorithm": "SHA-256"})["hash_value"]
+
+        # Routes whose cost does not depend on a payload are only run once
+        self.sized_routes = {
+            "/encrypt", "/encrypt/batch", "/encrypt/stream", "/encrypt/chunked",
+            "/decrypt", "/decrypt/batch", "/decrypt/stream", "/decrypt/chunked",
+            "/generate-hash", "/verify-hash", "/verify-hash/batch",
+        }
+        self.factories = {
+            "/generate-key": self.generate_key,
+            "/generate-key/batch": self.generate_key_batch,
+            "/encrypt": self.encrypt,
+            "/encrypt/batch": self.encrypt_batch,
+            "/encrypt/stream": self.encrypt_stream,
+            "/encrypt/chunked": self.encrypt_chunked,
+            "/decrypt": self.decrypt,
+            "/decrypt/batch": self.decrypt_batch,
+            "/decrypt/stream": self.decrypt_stream,
+            "/decrypt/chunked": self.decrypt_chunked,
+            "/generate-hash": self.generate_hash,
+            "/verify-hash": self.verify_hash,
+            "/verify-hash/batch": self.verify_hash_batch,
+            "/register": self.register,
+            "/login": self.login,
+            "/status": self.status,
+            "/metrics": self.metrics,
+        }
+
+    def generate_key(self, size):
+        return "POST", "/generate-key", {"json": {"key_type": "AES", "key_size": 256}}
+
+    def generate_key_batch(self, size):
+        return "POST", "/generate-key/batch", {"json": {"key_type": "AES", "key_size": 256, "count": BATCH_ITEMS}}
+
+    def encrypt(self, size):
+        return "POST", "/encrypt", {"json": {
+            "key_id": self.key_id, "plaintext": self.texts[size], "algorithm": "AES"}}
+
+    def encrypt_batch(self, size):
+        item = {"key_id": self.key_id, "plaintext": self.texts[size], "algorithm": "AES"}
+        return "POST", "/encrypt/batch", {"json": {"items": [item] * BATCH_ITEMS}}
+
+    def encrypt_stream(self, size):
+        return "POST", f"/encrypt/stream?key_id={self.key_id}&algorithm=AES", {
+            "data": self.texts[size].encode(),
+            "headers": {"Content-Type": "application/octet-stream"}}
+
+    def encrypt_chunked(self, size):
+        return "POST", f"/encrypt/chunked?key_id={self.key_id}&algorithm=AES", {
+            "data": self.texts[size].encode(),
+            "headers": {"Content-Type": "application/octet-stream"}}
+
+    def decrypt(self, size):
+        return "POST", "/decrypt", {"json": {
+            "key_id": self.key_id, "ciphertext": self.ciphertexts[size], "algorithm": "AES"}}
+
+    def decrypt_batch(self, size):
+        item = {"key_id": self.key_id, "ciphertext": self.ciphertexts[size], "algorithm": "AES"}
+        return "POST", "/decrypt/batch", {"json": {"items": [item] * BATCH_ITEMS}}
+
+    def decrypt_stream(self, size):
+        return "POST", f"/decrypt/stream?key_id={self.key_id}&algorithm=AES", {
+            "data": self.raw_ciphertexts[size],
+            "headers": {"Content-Type": "application/octet-stream"}}
+
+    def decrypt_chunked(self, size):
+        return "POST", f"/decrypt/chunked?key_id={self.key_id}&algorithm=AES", {
+            "data": self.chunked_ciphertexts[size],
+            "headers": {"Content-Type": "application/octet-stream"}}
+
+    def generate_hash(self, size):
+        return "POST", "/generate-hash", {"json": {"data": self.texts[size], "algorithm": "SHA-256"}}
+
+    def verify_hash(self, size):
+        return "POST", "/verify-hash", {"json": {
+            "data": self.texts[size], "hash_value": self.hashes[size], "algorithm": "SHA-256"}}
+
+    def verify_hash_batch(self, size):
+        item = {"data": self.texts[size], "hash_value": self.hashes[size]}
+        return "POST", "/verify-hash/batch", {"json": {"algorithm": "SHA-256", "items": [item] * BATCH_ITEMS}}
+
+    def register(self, size):
+        username = f"{self.username}-{next(self.usernames)}"
+        return "POST", "/register", {"json": {"username": username, "password": self.password}}
+
+    def login(self, size):
+        return "POST", "/login", {"json": {"username": self.username, "password": self.password}}
+
+    def status(self, size):
+        return "GET", "/status", {}
+
+    def metrics(self, size):
+        return "GET", "/metrics", {}
+
+def swagger_routes():
+    with open(os.path.join(BASE_DIR, "swagger.yml")) as f:
+        return list(yaml.safe_load(f)["paths"])
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+def run_case(client, factory, size, concurrency, requests):
+    latencies = []
+    errors = 0
+    remaining = itertools.count(requests, -1)
+    lock = threading.Lock()
+
+    def worker():
+        nonlocal errors
+        local_latencies = []
+        local_errors = 0
+        while next(remaining) > 0:
+            method, path, kwargs = factory(size)
+            start = time.perf_counter()
+            status, _ = client.request(method, path, **kwargs)
+            local_latencies.append(time.perf_counter() - start)
+            if status >= 400:
+                local_errors += 1
+        with lock:
+            latencies.extend(local_latencies)
+            errors += local_errors
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for future in [pool.submit(worker) for _ in range(concurrency)]:
+            future.result()
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": len(latencies) / elapsed,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+    }
+
+def run(client, routes, sizes, concurrency_levels, requests):
+    scenarios = Scenarios(client, sizes)
+    missing = [route for route in routes if route not in scenarios.factories]
+    if missing:
+        raise SystemExit(f"No benchmark scenario for {', '.join(missing)}")
+
+    results = []
+    for route in routes:
+        route_sizes = sizes if route in scenarios.sized_routes else [0]
+        for size in route_sizes:
+            for concurrency in concurrency_levels:
+                result = run_case(client, scenarios.factories[route], size, concurrency, requests)
+                result.update({"route": route, "payload_bytes": size, "concurrency": concurrency})
+                results.append(result)
+                print_result(result)
+    return results
+
+def print_header():
+    print(f"{'route':<20} {'payload':>8} {'conc':>5} {'req/s':>10} {'p50 ms':>9} "
+          f"{'p95 ms':>9} {'p99 ms':>9} {'errors':>7}")
+
+def print_result(r):
+    print(f"{r['route']:<20} {r['payload_bytes']:>8} {r['concurrency']:>5} {r['throughput_rps']:>10.1f} "
+          f"{r['p50_ms']:>9.2f} {r['p95_ms']:>9.2f} {r['p99_ms']:>9.2f} {r['errors']:>7}")
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=BASE_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(baseline_path, results, threshold):
+    with open(baseline_path) as f:
+        baseline = {(r["route"], r["payload_bytes"], r["concurrency"]): r for r in json.load(f)["results"]}
+
+    regressions = 0
+    print(f"\nCompared with {baseline_path}")
+    print(f"{'route':<20} {'payload':>8} {'conc':>5} {'req/s':>9} {'p99':>9}")
+    for r in results:
+        old = baseline.get((r["route"], r["payload_bytes"], r["concurrency"]))
+        if old is None:
+            continue
+        throughput_change = r["throughput_rps"] / old["throughput_rps"] - 1
+        p99_change = r["p99_ms"] / old["p99_ms"] - 1
+        regressed = throughput_change < -threshold or p99_change > threshold
+        regressions += regressed
+        print(f"{r['route']:<20} {r['payload_bytes']:>8} {r['concurrency']:>5} "
+              f"{throughput_change:>+8.1%} {p99_change:>+8.1%}{'  REGRESSION' if regressed else ''}")
+    return regressions
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Throughput and latency benchmark for the crypto API")
+    parser.add_argument("--url", help="benchmark a running server instead of the app in-process")
+    parser.add_argument("--routes", nargs="+", help="routes to run (default: every route in swagger.yml)")
+    parser.add_argument("--sizes", type=int, nargs="+", default=PAYLOAD_SIZES, help="payload sizes in bytes")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=CONCURRENCY,
+                        help="numbers of concurrent clients")
+    parser.add_argument("--requests", type=int, default=200, help="requests per measurement")
+    parser.add_argument("--output", help="save the results as a JSON baseline")
+    parser.add_argument("--compare", help="JSON baseline to compare the results with")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="relative change counted as a regression (default 0.10)")
+    args = parser.parse_args()
+
+    client = HTTPClient(args.url) if args.url else InProcessClient()
+    print_header()
+    results = run(client, args.routes or swagger_routes(), args.sizes, args.concurrency, args.requests)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({
+                "meta": {
+                    "created": datetime.now(timezone.utc).isoformat(),
+                    "commit": git_commit(),
+                    "target": client.target,
+                    "python": platform.python_version(),
+                    "cpu_count": os.cpu_count(),
+                },
+                "results": results,
+            }, f, indent=2)
+
+    if args.compare and compare(args.compare, results, args.threshold):
+        raise SystemExit(1)
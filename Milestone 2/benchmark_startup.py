@@ -0,0 +1,70 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+IMPORT_SCRIPT = """
+import time
+start = time.perf_counter()
+import app
+imported = time.perf_counter() - start
+start = time.perf_counter()
+status = app.app.test_client().get("/apidocs/").status_code
+print(imported, time.perf_counter() - start, status)
+"""
+
+# (label, SWAGGER_MODE, use the compiled swagger.json)
+CASES = [
+    ("eager, parse swagger.yml", "eager", False),
+    ("eager, cached swagger.json", "eager", True),
+    ("lazy", "lazy", True),
+    ("off", "off", True),
+]
+
+def run_once(mode):
+    env = dict(os.environ, SWAGGER_MODE=mode)
+    # A fixed bcrypt cost keeps the calibration out of the measurement
+    env.setdefault("BCRYPT_COST", "10")
+    out = subprocess.run([sys.executable, "-c", IMPORT_SCRIPT], cwd=BASE_DIR, env=env,
+                         capture_output=True, text=True, check=True).stdout.split()
+    return float(out[0]), float(out[1]), int(out[2])
+
+def run(repeat):
+    from api_docs import SPEC_CACHE, compile_spec
+    results = []
+    for label, mode, cached in CASES:
+        imports, first_docs = [], []
+        for _ in range(repeat):
+            if cached:
+                compile_spec()
+            elif os.path.exists(SPEC_CACHE):
+                os.remove(SPEC_CACHE)
+            imported, docs, status = run_once(mode)
+            imports.append(imported)
+            first_docs.append(docs)
+        results.append({
+            "case": label,
+            "import_ms": statistics.median(imports) * 1000,
+            "first_apidocs_ms": statistics.median(first_docs) * 1000,
+            "apidocs_status": status,
+        })
+    compile_spec()
+    return results
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Measure how long importing app.py takes in each SWAGGER_MODE")
+    parser.add_argument("--repeat", type=int, default=5, help="fresh interpreters per case (median is reported)")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    args = parser.parse_args()
+
+    results = run(args.repeat)
+    print(f"{'case':<28} {'import ms':>10} {'first /apidocs ms':>18}")
+    for r in results:
+        print(f"{r['case']:<28} {r['import_ms']:>10.1f} {r['first_apidocs_ms']:>18.1f}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,135 @@
+import os
+import struct
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+
+# Chunked AES-GCM in the STREAM construction. The message is split into
+# chunks that are sealed independently, so they can be encrypted and
+# decrypted on several cores at once. The output is a header followed by the
+# sealed chunks in order:
+#
+#   header = version (1 byte) | chunk size (4 bytes) | salt (16 bytes)
+#   message key = HKDF-SHA256(key, salt, info = "EN4720 chunked AEAD")
+#   chunk i = AES-GCM(message key, nonce = 0 (7 bytes) | i (4 bytes) | last (1 byte), aad = header)
+#
+# Every message is sealed with its own key derived from a random salt, as in
+# Tink's streaming AEAD, so the nonce only has to be unique within a message
+# and a counter is enough. A 128-bit salt does not collide in practice,
+# whereas random nonces under one key would repeat after about 2^28 messages.
+# The last-chunk flag in the nonce makes truncation at a chunk boundary fail
+# authentication, and the chunk index makes reordering fail.
+VERSION = 2
+HEADER = struct.Struct(">BI16s")
+SALT_SIZE = 16
+TAG_SIZE = 16
+MAX_CHUNKS = 2 ** 32
+MIN_CHUNK_SIZE = 1024
+MAX_CHUNK_SIZE = 64 * 1024 * 1024
+
+CHUNK_SIZE = int(os.environ.get("AEAD_CHUNK_SIZE", 1024 * 1024))
+CHUNK_WORKERS = int(os.environ.get("AEAD_CHUNK_WORKERS", os.cpu_count() or 1))
+
+NONCE = struct.Struct(">7xIB")
+
+def message_key(key, salt):
+    return AESGCM(HKDF(algorithm=hashes.SHA256(), length=len(key), salt=salt,
+                       info=b"EN4720 chunked AEAD").derive(key))
+
+class ChunkedAEAD:
+    # cryptography releases the GIL while it encrypts, so a thread pool is
+    # enough to spread one large message over several cores
+    def __init__(self, workers=CHUNK_WORKERS):
+        self.workers = workers
+        self.pool = None
+        self.pool_pid = None
+        self.lock = threading.Lock()
+
+    def get_pool(self):
+        # Pool threads do not survive a fork, so each worker starts its own
+        if self.pool_pid != os.getpid():
+            with self.lock:
+                if self.pool_pid != os.getpid():
+                    self.pool = ThreadPoolExecutor(max_workers=self.workers)
+                    self.pool_pid = os.getpid()
+        return self.pool
+
+    def run(self, fn, count):
+        if count == 1 or self.workers <= 1:
+            for i in range(count):
+                fn(i)
+            return
+        # Consuming the results re-raises the first error of any chunk
+        for _ in self.get_pool().map(fn, range(count)):
+            pass
+
+    # Both methods write every chunk into one preallocated bytearray, which
+    # they return. Large fresh allocations are slow, so this is much faster
+    # than joining the chunks; cryptography 47+ even encrypts in place.
+    def encrypt(self, key, data, chunk_size=CHUNK_SIZE):
+        if not MIN_CHUNK_SIZE <= chunk_size <= MAX_CHUNK_SIZE:
+            raise ValueError(f"chunk_size must be between {MIN_CHUNK_SIZE} and {MAX_CHUNK_SIZE}")
+        count = max(1, -(-len(data) // chunk_size))
+        if count > MAX_CHUNKS:
+            raise ValueError("Too many chunks")
+
+        salt = os.urandom(SALT_SIZE)
+        header = HEADER.pack(VERSION, chunk_size, salt)
+        aesgcm = message_key(key, salt)
+        view = memoryview(data)
+        out = bytearray(HEADER.size + len(data) + count * TAG_SIZE)
+        out[:HEADER.size] = header
+        out_view = memoryview(out)[HEADER.size:]
+        encrypt_into = getattr(aesgcm, "encrypt_into", None)
+
+        def seal(i):
+            chunk = view[i * chunk_size:(i + 1) * chunk_size]
+            nonce = NONCE.pack(i, i == count - 1)
+            start = i * (chunk_size + TAG_SIZE)
+            end = start + len(chunk) + TAG_SIZE
+            if encrypt_into:
+                encrypt_into(nonce, chunk, header, out_view[start:end])
+            else:
+                out_view[start:end] = aesgcm.encrypt(nonce, chunk, header)
+
+        self.run(seal, count)
+        return out
+
+    def decrypt(self, key, data):
+        # Raises ValueError for a malformed header and InvalidTag when a chunk
+        # does not authenticate
+        if len(data) < HEADER.size + TAG_SIZE:
+            raise ValueError("Ciphertext is too short")
+        version, chunk_size, salt = HEADER.unpack_from(data)
+        if version != VERSION or not MIN_CHUNK_SIZE <= chunk_size <= MAX_CHUNK_SIZE:
+            raise ValueError("Unsupported chunked ciphertext")
+
+        header = bytes(data[:HEADER.size])
+        aesgcm = message_key(key, salt)
+        body = memoryview(data)[HEADER.size:]
+        sealed_size = chunk_size + TAG_SIZE
+        count = -(-len(body) // sealed_size)
+        if count > MAX_CHUNKS:
+            raise ValueError("Too many chunks")
+        if len(body) - (count - 1) * sealed_size < TAG_SIZE:
+            raise InvalidTag()
+        out = bytearray(len(body) - count * TAG_SIZE)
+        out_view = memoryview(out)
+        decrypt_into = getattr(aesgcm, "decrypt_into", None)
+
+        def open_chunk(i):
+            chunk = body[i * sealed_size:(i + 1) * sealed_size]
+            nonce = NONCE.pack(i, i == count - 1)
+            start = i * chunk_size
+            end = start + len(chunk) - TAG_SIZE
+            if decrypt_into:
+                decrypt_into(nonce, chunk, header, out_view[start:end])
+            else:
+                out_view[start:end] = aesgcm.decrypt(nonce, chunk, header)
+
+        self.run(open_chunk, count)
+        return out
@@ -0,0 +1,115 @@
+import itertools
+import os
+
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers import algorithms
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+
+from lru_cache import LRUCache
+
+CIPHER_CACHE_SIZE = int(os.environ.get("CIPHER_CACHE_SIZE", 256))
+DERIVED_KEY_CACHE_SIZE = int(os.environ.get("DERIVED_KEY_CACHE_SIZE", 10000))
+# AES-GCM messages are sealed with subkeys derived from the stored key and a
+# random salt. A random 96-bit nonce is only safe for about 2^32 messages
+# under one key, which a busy key reaches within days; a subkey seals at most
+# GCM_MESSAGES_PER_SUBKEY messages before the worker draws a new salt.
+GCM_MESSAGES_PER_SUBKEY = int(os.environ.get("GCM_MESSAGES_PER_SUBKEY", 2 ** 20))
+GCM_SALT_SIZE = 16
+# Subkeys of the salts seen most recently, per key, for decryption
+GCM_OPENER_CACHE_SIZE = 16
+
+def derive_key(master_key, device_id):
+    # Per-device key of the same size as the master key. Nothing is stored:
+    # the same (master key, device ID) always gives the same key.
+    return HKDF(algorithm=hashes.SHA256(), length=len(master_key), salt=None,
+                info=b"EN4720 device key\x00" + device_id.encode()).derive(master_key)
+
+def derive_gcm_subkey(key, salt):
+    return AESGCM(HKDF(algorithm=hashes.SHA256(), length=len(key), salt=salt,
+                       info=b"EN4720 GCM subkey").derive(key))
+
+class PreparedKey:
+    # Cipher state that can be reused by every request for the same key.
+    # CBC and CTR ciphers are built around the shared AES algorithm object,
+    # which only spares them validating the key: the key schedule still runs
+    # in every Cipher(...).encryptor(). AESGCM objects do their key setup
+    # once, when they are created, so they are what the cache is for; they
+    # are only built on first GCM use, since most traffic is CBC.
+    __slots__ = ("key", "aes", "raw_aesgcm", "sealer", "openers")
+
+    def __init__(self, key):
+        self.key = key
+        self.aes = algorithms.AES(key)
+        self.raw_aesgcm = None
+        self.sealer = None
+        self.openers = None
+
+    @property
+    def aesgcm(self):
+        # AES-GCM under the key itself, for ciphertexts from before the subkeys
+        if self.raw_aesgcm is None:
+            self.raw_aesgcm = AESGCM(self.key)
+        return self.raw_aesgcm
+
+    def gcm_sealer(self):
+        # Returns (salt, AESGCM) for the next message. The counter hands out
+        # each use once, so no lock is needed; two threads that both find the
+        # subkey used up just draw two new salts.
+        sealer = self.sealer
+        if sealer is None or next(sealer[2]) >= GCM_MESSAGES_PER_SUBKEY:
+            salt = os.urandom(GCM_SALT_SIZE)
+            sealer = self.sealer = (salt, derive_gcm_subkey(self.key, salt), itertools.count(1))
+            self.gcm_openers().put(salt, sealer[1])
+        return sealer[0], sealer[1]
+
+    def gcm_opener(self, salt):
+        openers = self.gcm_openers()
+        aesgcm = openers.get(salt)
+        if aesgcm is None:
+            aesgcm = derive_gcm_subkey(self.key, salt)
+            openers.put(salt, aesgcm)
+        return aesgcm
+
+    def gcm_openers(self):
+        if self.openers is None:
+            self.openers = LRUCache(GCM_OPENER_CACHE_SIZE)
+        return self.openers
+
+class CipherCache:
+    # LRUs of PreparedKey by key ID and by (master key ID, device ID). Each
+    # entry remembers the stored key it was made from. Entries are dropped
+    # when this worker's key store deletes or rotates a key. A rotation done
+    # by another worker shows up once the key store's cached bytes expire
+    # (KEY_CACHE_TTL); the new bytes no longer match the remembered key, so
+    # the entry is rebuilt.
+    def __init__(self, key_store, capacity=CIPHER_CACHE_SIZE, derived_capacity=DERIVED_KEY_CACHE_SIZE):
+        self.key_store = key_store
+        self.cache = LRUCache(capacity)
+        self.derived = LRUCache(derived_capacity)
+        key_store.add_listener(self.evict)
+
+    def get(self, key_id, device_id=None):
+        key = self.key_store.get(key_id)
+        if key is None:
+            return None
+        if device_id is None:
+            cache, cache_key = self.cache, key_id
+        elif isinstance(device_id, str) and device_id:
+            cache, cache_key = self.derived, (key_id, device_id)
+        else:
+            return None
+
+        entry = cache.get(cache_key)
+        if entry is None or entry[0] != key:
+            prepared = PreparedKey(key if device_id is None else derive_key(key, device_id))
+            entry = (key, prepared)
+            cache.put(cache_key, entry)
+        return entry[1]
+
+    def evict(self, key_id):
+        self.cache.pop(key_id)
+        self.derived.remove_if(lambda cache_key: cache_key[0] == key_id)
+
+    def stats(self):
+        return {"keys": self.cache.stats(), "derived_keys": self.derived.stats()}
@@ -0,0 +1,9 @@
+import os
+
+def on_starting(server):
+    # Keys and users kept in memory are private to each worker: a key_id made
+    # by one worker is unknown to the others and IDs collide across workers
+    if server.cfg.workers > 1:
+        missing = [name for name in ("KEY_STORE_PATH", "USER_STORE_PATH") if not os.environ.get(name)]
+        if missing:
+            raise RuntimeError(f"{' and '.join(missing)} must be set to run more than one worker")
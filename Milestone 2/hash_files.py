@@ -0,0 +1,66 @@
+import argparse
+import json
+import mmap
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from hashing import HASH_ALGORITHMS, encode_digest
+
+def list_files(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for name in sorted(files):
+                    yield os.path.join(root, name)
+        else:
+            yield path
+
+def hash_file(path, algorithm):
+    # The file is memory-mapped and handed to hashlib as a buffer, so it is
+    # never copied into Python memory; hashlib releases the GIL while it
+    # hashes, which lets the thread pool use every core
+    hasher = HASH_ALGORITHMS[algorithm]()
+    with open(path, "rb") as f:
+        # Empty files cannot be mapped
+        if os.fstat(f.fileno()).st_size:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                hasher.update(mapped)
+    return encode_digest(hasher.digest())
+
+def hash_files(paths, algorithm, workers):
+    # Yields (path, hash_value, error) in the order of paths
+    def hash_one(path):
+        try:
+            return path, hash_file(path, algorithm), None
+        except OSError as e:
+            return path, None, e.strerror or str(e)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        yield from pool.map(hash_one, paths)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description="Hash files locally in the same base64 format as /generate-hash")
+    parser.add_argument("paths", nargs="+", help="files or directories (hashed recursively)")
+    parser.add_argument("--algorithm", default="SHA-256", choices=list(HASH_ALGORITHMS))
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="files hashed at once")
+    parser.add_argument("--json", action="store_true",
+                        help="print a JSON list of {path, hash_value, algorithm} instead of lines")
+    args = parser.parse_args()
+
+    results = []
+    failed = False
+    for path, hash_value, error in hash_files(list_files(args.paths), args.algorithm, args.workers):
+        if error:
+            failed = True
+            print(f"{path}: {error}", file=sys.stderr)
+        elif args.json:
+            results.append({"path": path, "hash_value": hash_value, "algorithm": args.algorithm})
+        else:
+            print(f"{hash_value}  {path}")
+    if args.json:
+        print(json.dumps(results, indent=2))
+    if failed:
+        raise SystemExit(1)
@@ -0,0 +1,15 @@
+import base64
+import hashlib
+
+# Shared by the API and hash_files.py so both produce the same digests
+HASH_ALGORITHMS = {
+    "SHA-256": hashlib.sha256,
+    "SHA-512": hashlib.sha512,
+    "SHA3-256": hashlib.sha3_256,
+    "SHA3-512": hashlib.sha3_512,
+    "BLAKE2b": hashlib.blake2b,
+    "BLAKE2s": hashlib.blake2s,
+}
+
+def encode_digest(digest):
+    return base64.b64encode(digest).decode('utf-8')
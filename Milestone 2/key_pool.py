@@ -0,0 +1,77 @@
+import os
+import threading
+from collections import deque
+
+KEY_SIZES = (128, 192, 256)
+KEY_POOL_SIZE = int(os.environ.get("KEY_POOL_SIZE", 0))
+
+def generate_keys(key_size, count):
+    # One urandom call for the whole batch
+    size = key_size // 8
+    data = os.urandom(size * count)
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+class KeyPool:
+    # Holds up to `size` keys of each size that are already generated and
+    # stored, so /generate-key is answered from memory. A background thread
+    # of each worker tops a pool up once it falls below half. Keys still in
+    # the pool when a worker exits stay in the key store unused. A size of 0
+    # disables the pool.
+    def __init__(self, key_store, size=KEY_POOL_SIZE, key_sizes=KEY_SIZES):
+        self.key_store = key_store
+        self.size = size
+        self.key_sizes = key_sizes
+        self.pools = {}
+        self.wakeup = threading.Event()
+        self.filler_pid = None
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def start_filler(self):
+        # A forked worker must not hand out the key IDs its parent had
+        # pooled, so it starts with empty pools and its own thread
+        if self.filler_pid == os.getpid():
+            return
+        with self.lock:
+            if self.filler_pid == os.getpid():
+                return
+            self.pools = {key_size: deque() for key_size in self.key_sizes}
+            self.wakeup = threading.Event()
+            self.filler_pid = os.getpid()
+            threading.Thread(target=self.fill, args=(self.pools, self.wakeup), daemon=True).start()
+
+    def take(self, key_size):
+        # Returns (key_id, key), or None if the pool is disabled or empty
+        if self.size <= 0 or key_size not in self.key_sizes:
+            return None
+        self.start_filler()
+        pool = self.pools[key_size]
+        try:
+            entry = pool.popleft()
+        except IndexError:
+            self.misses += 1
+            self.wakeup.set()
+            return None
+        self.hits += 1
+        if len(pool) < self.size // 2:
+            self.wakeup.set()
+        return entry
+
+    def fill(self, pools, wakeup):
+        while True:
+            for key_size, pool in pools.items():
+                missing = self.size - len(pool)
+                if missing > 0:
+                    keys = generate_keys(key_size, missing)
+                    pool.extend(zip(self.key_store.add_many(keys), keys))
+            wakeup.wait()
+            wakeup.clear()
+
+    def stats(self):
+        return {
+            "size": self.size,
+            "available": {str(key_size): len(pool) for key_size, pool in self.pools.items()},
+            "hits": self.hits,
+            "misses": self.misses,
+        }
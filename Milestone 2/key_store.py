@@ -0,0 +1,150 @@
+import itertools
+import os
+import threading
+
+from lru_cache import LRUCache
+from sqlite_connections import SQLiteConnections
+
+KEY_CACHE_SIZE = int(os.environ.get("KEY_CACHE_SIZE", 1024))
+KEY_CACHE_TTL = float(os.environ.get("KEY_CACHE_TTL", 2))
+# SQLite integer primary keys are signed 64-bit
+MAX_KEY_ID = 2 ** 63 - 1
+
+def parse_key_id(key_id):
+    # Returns the row ID, or None for anything SQLite never hands out:
+    # non-ASCII digits such as "²", leading zeros (which would cache one
+    # key under several IDs) and IDs past the 64-bit range
+    if not isinstance(key_id, str) or not key_id.isascii() or not key_id.isdigit() or len(key_id) > 19:
+        return None
+    row_id = int(key_id)
+    if row_id > MAX_KEY_ID or str(row_id) != key_id:
+        return None
+    return row_id
+
+class KeyStore:
+    # Listeners are called with the key ID whenever a key is deleted or
+    # rotated, so caches built on top of the store can drop it
+    def __init__(self):
+        self.listeners = []
+
+    def add_listener(self, listener):
+        self.listeners.append(listener)
+
+    def notify(self, key_id):
+        for listener in self.listeners:
+            listener(key_id)
+
+    def __contains__(self, key_id):
+        return self.get(key_id) is not None
+
+    def __getitem__(self, key_id):
+        key = self.get(key_id)
+        if key is None:
+            raise KeyError(key_id)
+        return key
+
+class MemoryKeyStore(KeyStore):
+    # Keys live in this process only. Fine for a single worker or for tests.
+    def __init__(self):
+        super().__init__()
+        self.keys = {}
+        self.ids = itertools.count(1)
+        self.lock = threading.Lock()
+
+    def add(self, key):
+        with self.lock:
+            key_id = str(next(self.ids))
+            self.keys[key_id] = key
+        return key_id
+
+    def add_many(self, keys):
+        with self.lock:
+            key_ids = [str(next(self.ids)) for _ in keys]
+            self.keys.update(zip(key_ids, keys))
+        return key_ids
+
+    def get(self, key_id):
+        if not isinstance(key_id, str):
+            return None
+        return self.keys.get(key_id)
+
+    def rotate(self, key_id, key):
+        with self.lock:
+            if key_id not in self.keys:
+                return False
+            self.keys[key_id] = key
+        self.notify(key_id)
+        return True
+
+    def delete(self, key_id):
+        with self.lock:
+            deleted = self.keys.pop(key_id, None) is not None
+        self.notify(key_id)
+        return deleted
+
+class SQLiteKeyStore(KeyStore):
+    # Keys are shared by every worker and survive restarts. SQLite hands out
+    # the IDs, so they never collide across workers. Each worker keeps an LRU
+    # of key bytes so the hot path does not touch the database. A rotation or
+    # deletion only notifies the worker that made it; the others read the
+    # key again once their cached bytes are ttl seconds old.
+    def __init__(self, path, cache_size=KEY_CACHE_SIZE, cache_ttl=KEY_CACHE_TTL):
+        super().__init__()
+        self.path = path
+        self.cache = LRUCache(cache_size, cache_ttl)
+        self.db = SQLiteConnections(
+            path,
+            "CREATE TABLE IF NOT EXISTS keys ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "key BLOB NOT NULL)"
+        )
+
+    def add(self, key):
+        with self.db.connect() as conn:
+            key_id = str(conn.execute("INSERT INTO keys (key) VALUES (?)", (key,)).lastrowid)
+        self.cache.put(key_id, key)
+        return key_id
+
+    def add_many(self, keys):
+        # One transaction, so the whole batch costs a single commit
+        with self.db.connect() as conn:
+            key_ids = [str(conn.execute("INSERT INTO keys (key) VALUES (?)", (key,)).lastrowid) for key in keys]
+        return key_ids
+
+    def get(self, key_id):
+        row_id = parse_key_id(key_id)
+        if row_id is None:
+            return None
+        key = self.cache.get(key_id)
+        if key is None:
+            row = self.db.connect().execute("SELECT key FROM keys WHERE id = ?", (row_id,)).fetchone()
+            if row is None:
+                return None
+            key = bytes(row[0])
+            self.cache.put(key_id, key)
+        return key
+
+    def rotate(self, key_id, key):
+        row_id = parse_key_id(key_id)
+        if row_id is None:
+            return False
+        with self.db.connect() as conn:
+            rotated = conn.execute("UPDATE keys SET key = ? WHERE id = ?", (key, row_id)).rowcount > 0
+        self.cache.pop(key_id)
+        self.notify(key_id)
+        return rotated
+
+    def delete(self, key_id):
+        self.cache.pop(key_id)
+        self.notify(key_id)
+        row_id = parse_key_id(key_id)
+        if row_id is None:
+            return False
+        with self.db.connect() as conn:
+            return conn.execute("DELETE FROM keys WHERE id = ?", (row_id,)).rowcount > 0
+
+def create_key_store():
+    path = os.environ.get("KEY_STORE_PATH")
+    if path:
+        return SQLiteKeyStore(path)
+    return MemoryKeyStore()
@@ -0,0 +1,65 @@
+import threading
+import time
+from collections import OrderedDict
+
+class LRUCache:
+    # With a ttl (seconds), entries also expire that long after they were put
+    def __init__(self, capacity, ttl=None):
+        self.capacity = capacity
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        with self.lock:
+            try:
+                value = self.entries[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            if self.ttl is not None:
+                expires, value = value
+                if expires <= time.monotonic():
+                    del self.entries[key]
+                    self.misses += 1
+                    return default
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        if self.capacity <= 0:
+            return
+        if self.ttl is not None:
+            value = (time.monotonic() + self.ttl, value)
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.capacity:
+                self.entries.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self.lock:
+            value = self.entries.pop(key, None)
+        if value is None:
+            return default
+        return value if self.ttl is None else value[1]
+
+    def remove_if(self, predicate):
+        with self.lock:
+            for key in [key for key in self.entries if predicate(key)]:
+                del self.entries[key]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        with self.lock:
+            return {"size": len(self.entries), "capacity": self.capacity,
+                    "hits": self.hits, "misses": self.misses}
+
+    def __len__(self):
+        return len(self.entries)
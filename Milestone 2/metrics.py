@@ -0,0 +1,265 @@
+import atexit
+import bisect
+import glob
+import json
+import os
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from functools import wraps
+
+from flask import g, request
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class Metrics:
+    # Prometheus-style counters, gauges and histograms.
+    #
+    # Every thread records into its own shard, so recording a value never takes
+    # a lock; shards are only merged when /metrics is scraped. When a thread
+    # (or greenlet) ends, its shard is folded into the retired totals and
+    # dropped, so the number of shards follows the live threads. With a
+    # directory set, each worker process also writes its totals to
+    # <directory>/metrics-<pid>.json every flush_interval seconds and a
+    # scrape adds up the files of all workers. Gauges only count workers that
+    # are still running. Empty the directory when the service is restarted.
+    def __init__(self, directory=None, flush_interval=1.0, buckets=DEFAULT_BUCKETS):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.buckets = buckets
+        self.kinds = {}
+        self.help = {}
+        self.local = threading.local()
+        self.shards = {}
+        self.retired = {}
+        # Shards of finished threads, appended by a finalizer that can run at
+        # any point in any thread, so it must not take shards_lock
+        self.dead_shards = []
+        self.shards_lock = threading.Lock()
+        self.pid = os.getpid()
+        self.flusher_pid = None
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            atexit.register(self.flush)
+
+    def describe(self, name, kind, text):
+        self.kinds[name] = kind
+        self.help[name] = text
+
+    def shard(self):
+        shard = getattr(self.local, "shard", None)
+        if shard is None or self.local.pid != os.getpid():
+            with self.shards_lock:
+                # A forked worker starts from zero rather than from the
+                # values its parent had recorded
+                if self.pid != os.getpid():
+                    self.shards = {}
+                    self.retired = {}
+                    self.dead_shards = []
+                    self.pid = os.getpid()
+                self.retire_dead_shards()
+                shard = self.local.shard = {}
+                self.local.pid = self.pid
+                self.shards[id(shard)] = shard
+                # The owner lives in the thread-local storage, which is
+                # cleared when the thread ends
+                self.local.owner = ShardOwner()
+                weakref.finalize(self.local.owner, self.dead_shards.append, shard)
+        return shard
+
+    def retire_dead_shards(self):
+        # Called with shards_lock held
+        while self.dead_shards:
+            shard = self.dead_shards.pop()
+            if self.shards.pop(id(shard), None) is shard:
+                for key, value in shard.items():
+                    merge(self.retired, key, list(value) if isinstance(value, list) else value)
+
+    def inc(self, name, labels=(), value=1):
+        shard = self.shard()
+        key = (name, labels)
+        shard[key] = shard.get(key, 0) + value
+
+    def dec(self, name, labels=(), value=1):
+        self.inc(name, labels, -value)
+
+    def observe(self, name, labels, value):
+        shard = self.shard()
+        key = (name, labels)
+        entry = shard.get(key)
+        if entry is None:
+            # One slot per bucket, one for +Inf, then the sum and the count
+            entry = shard[key] = [0] * (len(self.buckets) + 3)
+        entry[bisect.bisect_left(self.buckets, value)] += 1
+        entry[-2] += value
+        entry[-1] += 1
+
+    @contextmanager
+    def timer(self, operation):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe("crypto_operation_duration_seconds", (("operation", operation),),
+                         time.perf_counter() - start)
+
+    def timed(self, operation):
+        def decorator(fn):
+            @wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.timer(operation):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def snapshot(self):
+        totals = {}
+        with self.shards_lock:
+            if self.pid != os.getpid():
+                return totals
+            self.retire_dead_shards()
+            shards = list(self.shards.values())
+            for key, value in self.retired.items():
+                merge(totals, key, list(value) if isinstance(value, list) else value)
+        for shard in shards:
+            # dict.copy() is atomic under the GIL, so the owning thread can
+            # keep recording while we read
+            for key, value in shard.copy().items():
+                merge(totals, key, list(value) if isinstance(value, list) else value)
+        return totals
+
+    def flush(self):
+        if not self.directory:
+            return
+        entries = [[name, [list(label) for label in labels], value]
+                   for (name, labels), value in self.snapshot().items()]
+        path = os.path.join(self.directory, f"metrics-{os.getpid()}.json")
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(entries, f)
+        os.replace(tmp_path, path)
+
+    def start_flusher(self):
+        # Each worker flushes from a background thread, so values recorded
+        # just before a worker goes idle still reach the other workers
+        if not self.directory or self.flusher_pid == os.getpid():
+            return
+        with self.shards_lock:
+            if self.flusher_pid == os.getpid():
+                return
+            self.flusher_pid = os.getpid()
+        threading.Thread(target=self.flush_periodically, daemon=True).start()
+
+    def flush_periodically(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    def collect(self):
+        if not self.directory:
+            return self.snapshot()
+
+        self.flush()
+        totals = {}
+        for path in glob.glob(os.path.join(self.directory, "metrics-*.json")):
+            pid = int(os.path.basename(path)[len("metrics-"):-len(".json")])
+            alive = pid_alive(pid)
+            try:
+                with open(path) as f:
+                    entries = json.load(f)
+            except (OSError, ValueError):
+                continue
+            for name, labels, value in entries:
+                if self.kinds.get(name) == "gauge" and not alive:
+                    continue
+                merge(totals, (name, tuple(tuple(label) for label in labels)), value)
+        return totals
+
+    def render(self):
+        by_name = {}
+        for (name, labels), value in sorted(self.collect().items()):
+            by_name.setdefault(name, []).append((labels, value))
+
+        lines = []
+        for name, samples in by_name.items():
+            kind = self.kinds.get(name, "untyped")
+            if name in self.help:
+                lines.append(f"# HELP {name} {self.help[name]}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                if kind != "histogram":
+                    lines.append(f"{name}{format_labels(labels)} {value}")
+                    continue
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float("inf"),), value):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f"{name}_bucket{format_labels(labels + (('le', le),))} {cumulative}")
+                lines.append(f"{name}_sum{format_labels(labels)} {value[-2]}")
+                lines.append(f"{name}_count{format_labels(labels)} {value[-1]}")
+        return "\n".join(lines) + "\n"
+
+class ShardOwner:
+    # Placeholder whose lifetime is that of the thread that owns a shard
+    __slots__ = ("__weakref__",)
+
+def merge(totals, key, value):
+    if isinstance(value, list):
+        current = totals.get(key)
+        if current is None:
+            totals[key] = value
+        else:
+            for i, v in enumerate(value):
+                current[i] += v
+    else:
+        totals[key] = totals.get(key, 0) + value
+
+def pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def escape_label_value(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{escape_label_value(v)}"' for k, v in labels) + "}"
+
+def instrument_app(app, metrics):
+    metrics.describe("http_requests_total", "counter", "HTTP requests handled, by route, method and status.")
+    metrics.describe("http_requests_in_flight", "gauge", "HTTP requests currently being handled, by route.")
+    metrics.describe("http_request_duration_seconds", "histogram",
+                     "Time to produce the response, by route and method.")
+    metrics.describe("crypto_operation_duration_seconds", "histogram",
+                     "Time spent in JSON parsing and in each cryptographic primitive.")
+
+    def route_label():
+        # Label by URL rule rather than path to keep the number of series bounded
+        return request.url_rule.rule if request.url_rule else "unmatched"
+
+    @app.before_request
+    def start_request_timer():
+        g.metrics_route = route_label()
+        g.metrics_start = time.perf_counter()
+        metrics.inc("http_requests_in_flight", (("route", g.metrics_route),))
+
+    @app.after_request
+    def record_request(response):
+        if "metrics_start" in g:
+            labels = (("method", request.method), ("route", g.metrics_route))
+            metrics.observe("http_request_duration_seconds", labels, time.perf_counter() - g.metrics_start)
+            metrics.inc("http_requests_total", labels + (("status", str(response.status_code)),))
+        return response
+
+    @app.teardown_request
+    def finish_request(exc):
+        if "metrics_route" in g:
+            metrics.dec("http_requests_in_flight", (("route", g.metrics_route),))
+        metrics.start_flusher()
@@ -0,0 +1,138 @@
+import argparse
+import cProfile
+import hashlib
+import hmac
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+
+from flask import g, request
+
+PROFILE_HEADER = "X-Profile"
+
+def sign(secret, path, expires):
+    message = f"{expires}:{path}".encode()
+    return hmac.new(secret.encode(), message, hashlib.sha256).hexdigest()
+
+def header_value(secret, path, ttl):
+    expires = int(time.time()) + ttl
+    return f"{expires}.{sign(secret, path, expires)}"
+
+def valid_header(secret, path, value):
+    # "<expires>.<hex HMAC-SHA256 of '<expires>:<path>'>"
+    expires, _, signature = value.partition(".")
+    if not expires.isdigit() or int(expires) < time.time():
+        return False
+    return hmac.compare_digest(signature, sign(secret, path, int(expires)))
+
+class StackSampler:
+    # Low-overhead alternative to cProfile: a thread records the stack of the
+    # request thread every `interval` seconds, in collapsed-stack format
+    # ("outer;inner;leaf count") for flame graph tools
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.done = threading.Event()
+        self.thread = threading.Thread(target=self.sample, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def sample(self):
+        while not self.done.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def stop(self):
+        self.done.set()
+        self.thread.join()
+
+    def dump(self, path):
+        with open(path, "w") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+def install_profiling(app):
+    # Profiling is off unless PROFILE_DIR is set, and then no hooks are
+    # registered at all. A request is profiled when it is picked by
+    # PROFILE_RATE or carries a valid X-Profile header signed with
+    # PROFILE_SECRET (see `python profiling.py --help`). PROFILE_ROUTES limits
+    # profiling to a comma-separated list of URL rules.
+    directory = os.environ.get("PROFILE_DIR")
+    if not directory:
+        return
+    os.makedirs(directory, exist_ok=True)
+    mode = os.environ.get("PROFILE_MODE", "cprofile")
+    if mode not in ("cprofile", "sample"):
+        raise ValueError(f"Unknown PROFILE_MODE {mode!r}")
+    rate = float(os.environ.get("PROFILE_RATE", 0))
+    secret = os.environ.get("PROFILE_SECRET")
+    interval = float(os.environ.get("PROFILE_INTERVAL_MS", 1)) / 1000
+    routes = {route for route in os.environ.get("PROFILE_ROUTES", "").split(",") if route}
+    # Only one cProfile profiler can be active at a time on recent Pythons
+    cprofile_lock = threading.Lock()
+
+    def wanted():
+        if routes and (request.url_rule is None or request.url_rule.rule not in routes):
+            return False
+        if rate and random.random() < rate:
+            return True
+        value = request.headers.get(PROFILE_HEADER)
+        return bool(secret and value and valid_header(secret, request.path, value))
+
+    @app.before_request
+    def start_profiler():
+        if not wanted():
+            return
+        if mode == "sample":
+            g.profiler = StackSampler(threading.get_ident(), interval)
+            g.profiler.start()
+        elif cprofile_lock.acquire(blocking=False):
+            g.profiler = cProfile.Profile()
+            g.profiler.enable()
+        else:
+            return
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        name = route.strip("/").replace("/", "_") or "root"
+        extension = "collapsed" if mode == "sample" else "prof"
+        g.profile_file = f"{time.time_ns()}-{os.getpid()}-{request.method}-{name}.{extension}"
+
+    @app.after_request
+    def name_profile(response):
+        if "profile_file" in g:
+            response.headers["X-Profile-File"] = g.profile_file
+        return response
+
+    @app.teardown_request
+    def stop_profiler(exc):
+        profiler = g.pop("profiler", None)
+        if profiler is None:
+            return
+        path = os.path.join(directory, g.profile_file)
+        if mode == "sample":
+            profiler.stop()
+            profiler.dump(path)
+        else:
+            profiler.disable()
+            cprofile_lock.release()
+            profiler.dump_stats(path)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Print an X-Profile header value that profiles requests to a path")
+    parser.add_argument("path", help="request path, e.g. /encrypt")
+    parser.add_argument("--ttl", type=int, default=300, help="seconds the header stays valid")
+    args = parser.parse_args()
+
+    if not os.environ.get("PROFILE_SECRET"):
+        raise SystemExit("Set PROFILE_SECRET to the server's value")
+    print(f"{PROFILE_HEADER}: {header_value(os.environ['PROFILE_SECRET'], args.path, args.ttl)}")
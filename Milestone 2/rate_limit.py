@@ -0,0 +1,57 @@
+import threading
+import time
+
+class TokenBucketLimiter:
+    # Token bucket stored as a single float per key (the GCRA formulation):
+    # the time at which the bucket will be full again. A key whose time has
+    # passed has a full bucket, which is the same as having no entry at all,
+    # so those entries are dropped lazily during periodic sweeps.
+    def __init__(self, rate, burst, sweep_interval=60.0, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self.capacity = burst * self.interval
+        self.sweep_interval = sweep_interval
+        self.clock = clock
+        self.full_at = {}
+        self.lock = threading.Lock()
+        self.next_sweep = clock() + sweep_interval
+        self.allowed = 0
+        self.throttled = 0
+
+    @property
+    def enabled(self):
+        return self.rate > 0
+
+    def allow(self, key):
+        # Returns (allowed, seconds until the next request would be allowed)
+        if not self.enabled:
+            return True, 0.0
+
+        now = self.clock()
+        with self.lock:
+            if now >= self.next_sweep:
+                self.sweep(now)
+
+            full_at = max(self.full_at.get(key, now), now) + self.interval
+            retry_after = full_at - self.capacity - now
+            if retry_after > 0:
+                self.throttled += 1
+                return False, retry_after
+
+            self.full_at[key] = full_at
+            self.allowed += 1
+            return True, 0.0
+
+    def sweep(self, now):
+        self.full_at = {key: full_at for key, full_at in self.full_at.items() if full_at > now}
+        self.next_sweep = now + self.sweep_interval
+
+    def stats(self):
+        return {
+            "rate_per_sec": self.rate,
+            "burst": self.burst,
+            "tracked_keys": len(self.full_at),
+            "allowed": self.allowed,
+            "throttled": self.throttled,
+        }
@@ -0,0 +1,79 @@
+import os
+import queue
+import sys
+import threading
+from datetime import datetime
+
+SECURITY_QUEUE_SIZE = int(os.environ.get("SECURITY_QUEUE_SIZE", 10000))
+
+class SecurityEvents:
+    # Feeds request events to the smart-home AttackDetector without slowing
+    # the request down. record() only puts the event on a bounded queue; a
+    # background thread of each worker passes them to
+    # AttackDetector.instrument. When the queue is full the event is dropped
+    # and counted. With no detector configured record() does nothing.
+    def __init__(self, detector, metrics, queue_size=SECURITY_QUEUE_SIZE):
+        self.detector = detector
+        self.metrics = metrics
+        self.queue_size = queue_size
+        self.queue = None
+        self.queue_pid = None
+        self.lock = threading.Lock()
+        metrics.describe("security_events_total", "counter",
+                         "Events sent to the attack detector, by event and outcome.")
+
+    @property
+    def enabled(self):
+        return self.detector is not None
+
+    def get_queue(self):
+        # The consumer thread does not survive a fork, so each worker starts
+        # its own queue and thread
+        if self.queue_pid != os.getpid():
+            with self.lock:
+                if self.queue_pid != os.getpid():
+                    self.queue = queue.Queue(maxsize=self.queue_size)
+                    threading.Thread(target=self.consume, args=(self.queue,), daemon=True).start()
+                    self.queue_pid = os.getpid()
+        return self.queue
+
+    def record(self, event_name, user_id, source_id, context=None, user_role="user"):
+        if not self.enabled:
+            return
+        try:
+            self.get_queue().put_nowait((event_name, user_role, user_id, source_id, datetime.now(), context or {}))
+        except queue.Full:
+            self.metrics.inc("security_events_total", (("event", event_name), ("outcome", "dropped")))
+
+    def consume(self, events):
+        while True:
+            event = events.get()
+            try:
+                outcome = "attack" if self.detector.instrument(*event) else "ok"
+            except Exception:
+                # A failing detector must not stop the consumer
+                outcome = "error"
+            self.metrics.inc("security_events_total", (("event", event[0]), ("outcome", outcome)))
+
+    def stats(self):
+        events = self.queue if self.queue_pid == os.getpid() else None
+        return {
+            "enabled": self.enabled,
+            "queued": events.qsize() if events else 0,
+            "queue_size": self.queue_size,
+        }
+
+def create_attack_detector():
+    # ATTACK_DETECTOR_PATH is the directory containing the smart_home_security
+    # package (Milestone 4). Without it the integration is off.
+    path = os.environ.get("ATTACK_DETECTOR_PATH")
+    if not path:
+        return None
+    path = os.path.abspath(path)
+    if path not in sys.path:
+        sys.path.append(path)
+    from smart_home_security import AttackDetector
+    geoip_db_path = os.environ.get("ATTACK_GEOIP_DB",
+                                   os.path.join(path, "smart_home_security", "detectors", "GeoLite2-City.mmdb"))
+    return AttackDetector(log_file=os.environ.get("ATTACK_LOG_FILE", "logs.json"), geoip_db_path=geoip_db_path,
+                          geoip_mode=os.environ.get("ATTACK_GEOIP_MODE", "mmap"))
@@ -0,0 +1,24 @@
+import os
+import sqlite3
+import threading
+
+class SQLiteConnections:
+    # Connections to one SQLite database for the key and user stores. A
+    # sqlite3 connection cannot be shared across threads or survive a fork,
+    # so each thread of each worker opens its own on first use. The database
+    # runs in WAL mode, where readers do not wait for the writer.
+    def __init__(self, path, schema):
+        self.path = path
+        self.local = threading.local()
+        with self.connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(schema)
+
+    def connect(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None or self.local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self.local.conn = conn
+            self.local.pid = os.getpid()
+        return conn
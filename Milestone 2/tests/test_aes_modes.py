@@ -0,0 +1,61 @@
+import os
+import unittest
+from unittest import mock
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from aes_modes import AES_MODES, decrypt_aes_bytes, encrypt_aes_bytes
+from cipher_cache import GCM_SALT_SIZE, PreparedKey
+
+class TestAESModes(unittest.TestCase):
+    def setUp(self):
+        self.key = os.urandom(32)
+        self.prepared = PreparedKey(self.key)
+
+    def test_round_trip(self):
+        for mode in AES_MODES:
+            for size in (0, 1, 16, 1000):
+                data = os.urandom(size)
+                self.assertEqual(decrypt_aes_bytes(self.prepared, encrypt_aes_bytes(self.prepared, data, mode), mode),
+                                 data)
+
+    def test_gcm_opens_in_another_worker(self):
+        ciphertext = encrypt_aes_bytes(self.prepared, b"reading", "GCM")
+        self.assertEqual(decrypt_aes_bytes(PreparedKey(self.key), ciphertext, "GCM"), b"reading")
+
+    def test_gcm_subkey_changes_after_limit(self):
+        with mock.patch("cipher_cache.GCM_MESSAGES_PER_SUBKEY", 2):
+            salts = [encrypt_aes_bytes(self.prepared, b"x", "GCM")[:GCM_SALT_SIZE] for _ in range(5)]
+        self.assertEqual(salts[0], salts[1])
+        self.assertNotEqual(salts[1], salts[2])
+        self.assertEqual(salts[2], salts[3])
+        self.assertEqual(len(set(salts)), 3)
+
+    def test_gcm_workers_use_different_subkeys(self):
+        other = PreparedKey(self.key)
+        self.assertNotEqual(encrypt_aes_bytes(self.prepared, b"x", "GCM")[:GCM_SALT_SIZE],
+                            encrypt_aes_bytes(other, b"x", "GCM")[:GCM_SALT_SIZE])
+
+    def test_gcm_legacy_ciphertext(self):
+        # Sealed under the stored key itself, before the subkeys
+        for data in (b"", b"reading", os.urandom(100)):
+            nonce = os.urandom(12)
+            legacy = nonce + AESGCM(self.key).encrypt(nonce, data, None)
+            self.assertEqual(decrypt_aes_bytes(self.prepared, legacy, "GCM"), data)
+
+    def test_gcm_tampered(self):
+        ciphertext = bytearray(encrypt_aes_bytes(self.prepared, b"reading", "GCM"))
+        for index in (0, GCM_SALT_SIZE, len(ciphertext) - 1):
+            tampered = bytearray(ciphertext)
+            tampered[index] ^= 1
+            with self.assertRaises(InvalidTag):
+                decrypt_aes_bytes(self.prepared, bytes(tampered), "GCM")
+
+    def test_gcm_state_built_on_first_use(self):
+        for mode in ("CBC", "CTR"):
+            decrypt_aes_bytes(self.prepared, encrypt_aes_bytes(self.prepared, b"x", mode), mode)
+        self.assertIsNone(self.prepared.raw_aesgcm)
+        self.assertIsNone(self.prepared.sealer)
+        self.assertIsNone(self.prepared.openers)
+        decrypt_aes_bytes(self.prepared, encrypt_aes_bytes(self.prepared, b"x", "GCM"), "GCM")
+        self.assertIsNotNone(self.prepared.sealer)
+        self.assertIsNone(self.prepared.raw_aesgcm)
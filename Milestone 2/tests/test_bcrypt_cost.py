@@ -0,0 +1,59 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+import bcrypt_cost
+
+class TestLoadBcryptCost(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.path = os.path.join(self.directory.name, "bcrypt_cost.json")
+        environ = mock.patch.dict(os.environ)
+        environ.start()
+        self.addCleanup(environ.stop)
+        os.environ.pop("BCRYPT_COST", None)
+        calibrate = mock.patch("bcrypt_cost.calibrate_bcrypt_cost", return_value=(11, 120.0))
+        self.calibrate = calibrate.start()
+        self.addCleanup(calibrate.stop)
+
+    def test_environment_wins(self):
+        os.environ["BCRYPT_COST"] = "8"
+        self.assertEqual(bcrypt_cost.load_bcrypt_cost(self.path), (8, None))
+        self.calibrate.assert_not_called()
+
+    def test_first_worker_calibrates_and_others_read(self):
+        self.assertEqual(bcrypt_cost.load_bcrypt_cost(self.path), (11, 120.0))
+        self.assertEqual(bcrypt_cost.load_bcrypt_cost(self.path), (11, 120.0))
+        self.assertEqual(self.calibrate.call_count, 1)
+        with open(self.path) as f:
+            self.assertEqual(json.load(f)["cost"], 11)
+
+    def test_other_settings_recalibrate(self):
+        with open(self.path, "w") as f:
+            json.dump({"cost": 14, "cost_ms": 900.0, "settings": {"latency_budget_ms": 1000}}, f)
+        self.assertEqual(bcrypt_cost.load_bcrypt_cost(self.path), (11, 120.0))
+        self.calibrate.assert_called_once()
+
+    def test_corrupt_file_recalibrates(self):
+        with open(self.path, "w") as f:
+            f.write("{")
+        self.assertEqual(bcrypt_cost.load_bcrypt_cost(self.path), (11, 120.0))
+
+    def test_unwritable_directory_calibrates_locally(self):
+        path = os.path.join(self.directory.name, "missing", "bcrypt_cost.json")
+        self.assertEqual(bcrypt_cost.load_bcrypt_cost(path), (11, 120.0))
+        self.assertFalse(os.path.exists(path))
+
+class TestCalibrateBcryptCost(unittest.TestCase):
+    def test_largest_cost_within_budget(self):
+        # Every round doubles the time: 10 -> 50 ms, 11 -> 100 ms, 12 -> 200 ms, 13 -> 400 ms
+        with mock.patch("bcrypt_cost.time_bcrypt", side_effect=lambda cost: 50.0 * 2 ** (cost - 10)), \
+             mock.patch.multiple("bcrypt_cost", BCRYPT_LATENCY_BUDGET_MS=250, BCRYPT_MIN_COST=10, BCRYPT_MAX_COST=16):
+            self.assertEqual(bcrypt_cost.calibrate_bcrypt_cost(), (12, 200.0))
+
+    def test_never_below_minimum(self):
+        with mock.patch("bcrypt_cost.time_bcrypt", return_value=1000.0), \
+             mock.patch.multiple("bcrypt_cost", BCRYPT_LATENCY_BUDGET_MS=250, BCRYPT_MIN_COST=10, BCRYPT_MAX_COST=16):
+            self.assertEqual(bcrypt_cost.calibrate_bcrypt_cost(), (10, 1000.0))
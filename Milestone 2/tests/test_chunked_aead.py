@@ -0,0 +1,73 @@
+import os
+import unittest
+from cryptography.exceptions import InvalidTag
+from chunked_aead import ChunkedAEAD, HEADER, MIN_CHUNK_SIZE, TAG_SIZE
+
+class TestChunkedAEAD(unittest.TestCase):
+    def setUp(self):
+        self.aead = ChunkedAEAD(workers=1)
+        self.key = os.urandom(32)
+
+    def test_round_trip(self):
+        for size in (0, 1, MIN_CHUNK_SIZE, 5000):
+            data = os.urandom(size)
+            sealed = self.aead.encrypt(self.key, data, MIN_CHUNK_SIZE)
+            self.assertEqual(len(sealed), HEADER.size + size + max(1, -(-size // MIN_CHUNK_SIZE)) * TAG_SIZE)
+            self.assertEqual(bytes(self.aead.decrypt(self.key, sealed)), data)
+
+    def test_round_trip_on_thread_pool(self):
+        aead = ChunkedAEAD(workers=4)
+        data = os.urandom(20 * MIN_CHUNK_SIZE + 7)
+        sealed = aead.encrypt(self.key, data, MIN_CHUNK_SIZE)
+        self.assertEqual(bytes(aead.decrypt(self.key, sealed)), data)
+
+    def test_same_plaintext_gives_different_ciphertexts(self):
+        # Every message has its own salt, so its own key
+        data = b"x" * 100
+        self.assertNotEqual(self.aead.encrypt(self.key, data), self.aead.encrypt(self.key, data))
+
+    def test_wrong_key(self):
+        sealed = self.aead.encrypt(self.key, b"secret")
+        with self.assertRaises(InvalidTag):
+            self.aead.decrypt(os.urandom(32), sealed)
+
+    def test_tampered_chunk(self):
+        sealed = self.aead.encrypt(self.key, os.urandom(3000), MIN_CHUNK_SIZE)
+        sealed[HEADER.size + MIN_CHUNK_SIZE + TAG_SIZE + 5] ^= 1
+        with self.assertRaises(InvalidTag):
+            self.aead.decrypt(self.key, sealed)
+
+    def test_tampered_header(self):
+        # The header is authenticated with every chunk
+        sealed = self.aead.encrypt(self.key, b"secret")
+        sealed[HEADER.size - 1] ^= 1
+        with self.assertRaises(InvalidTag):
+            self.aead.decrypt(self.key, sealed)
+
+    def test_truncated_at_chunk_boundary(self):
+        sealed = self.aead.encrypt(self.key, os.urandom(3000), MIN_CHUNK_SIZE)
+        truncated = sealed[:HEADER.size + 2 * (MIN_CHUNK_SIZE + TAG_SIZE)]
+        with self.assertRaises(InvalidTag):
+            self.aead.decrypt(self.key, truncated)
+
+    def test_reordered_chunks(self):
+        sealed = self.aead.encrypt(self.key, os.urandom(3 * MIN_CHUNK_SIZE), MIN_CHUNK_SIZE)
+        sealed_size = MIN_CHUNK_SIZE + TAG_SIZE
+        first = HEADER.size
+        second = first + sealed_size
+        swapped = (sealed[:first] + sealed[second:second + sealed_size] +
+                   sealed[first:second] + sealed[second + sealed_size:])
+        with self.assertRaises(InvalidTag):
+            self.aead.decrypt(self.key, swapped)
+
+    def test_malformed_header(self):
+        with self.assertRaises(ValueError):
+            self.aead.decrypt(self.key, b"\x00" * 10)
+        sealed = self.aead.encrypt(self.key, b"secret")
+        sealed[0] = 1
+        with self.assertRaises(ValueError):
+            self.aead.decrypt(self.key, sealed)
+
+    def test_chunk_size_out_of_range(self):
+        with self.assertRaises(ValueError):
+            self.aead.encrypt(self.key, b"secret", MIN_CHUNK_SIZE - 1)
@@ -0,0 +1,47 @@
+import os
+import tempfile
+from hash_files import hash_file, hash_files, list_files
+from hashing import HASH_ALGORITHMS
+from tests.test_routes import BINARY, RouteTestCase
+
+class TestHashFiles(RouteTestCase):
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def write(self, name, data):
+        path = os.path.join(self.directory, name)
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
+
+    def test_matches_generate_hash(self):
+        # Includes the empty file, which is hashed without mmap
+        for data in (b"", b"hello", os.urandom(3 * 65536 + 1)):
+            path = self.write("data.bin", data)
+            for algorithm in HASH_ALGORITHMS:
+                response = self.client.post(f"/generate-hash?algorithm={algorithm}", data=data, content_type=BINARY)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(hash_file(path, algorithm), response.json["hash_value"])
+
+    def test_matches_generate_hash_json(self):
+        path = self.write("text.txt", b"hello")
+        response = self.client.post("/generate-hash", json={"data": "hello", "algorithm": "SHA3-256"})
+        self.assertEqual(hash_file(path, "SHA3-256"), response.json["hash_value"])
+
+    def test_results_in_order_with_errors(self):
+        first = self.write("a", b"a")
+        second = self.write("b", b"")
+        missing = os.path.join(self.directory, "missing")
+        results = list(hash_files([first, missing, second], "SHA-256", 2))
+        self.assertEqual([path for path, _, _ in results], [first, missing, second])
+        self.assertIsNone(results[1][1])
+        self.assertTrue(results[1][2])
+        self.assertEqual(results[2][1], hash_file(second, "SHA-256"))
+
+    def test_list_files_recurses_in_sorted_order(self):
+        os.makedirs(os.path.join(self.directory, "sub"))
+        paths = [self.write(name, b"") for name in ("b", os.path.join("sub", "c"), "a")]
+        self.assertEqual(list(list_files([self.directory])), sorted(paths))
@@ -0,0 +1,80 @@
+import os
+import threading
+import time
+import unittest
+from unittest import mock
+from key_pool import KeyPool, generate_keys
+from key_store import MemoryKeyStore
+
+class GatedKeyStore(MemoryKeyStore):
+    # add_many waits until the gate is open, so a test controls when the filler runs
+    def __init__(self):
+        super().__init__()
+        self.gate = threading.Event()
+
+    def add_many(self, keys):
+        self.gate.wait()
+        return super().add_many(keys)
+
+def wait_until(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise AssertionError("Timed out")
+        time.sleep(0.001)
+
+class TestKeyPool(unittest.TestCase):
+    def setUp(self):
+        self.store = GatedKeyStore()
+        self.pool = KeyPool(self.store, size=4, key_sizes=(128, 256))
+
+    def fill(self):
+        self.store.gate.set()
+        self.pool.start_filler()
+        wait_until(lambda: all(len(pool) == 4 for pool in self.pool.pools.values()))
+
+    def test_generate_keys(self):
+        keys = generate_keys(192, 3)
+        self.assertEqual([len(key) for key in keys], [24, 24, 24])
+        self.assertEqual(len(set(keys)), 3)
+
+    def test_miss_while_empty(self):
+        self.assertIsNone(self.pool.take(128))
+        self.assertEqual(self.pool.stats()["misses"], 1)
+        self.fill()
+        self.assertIsNotNone(self.pool.take(128))
+
+    def test_hit_returns_stored_key(self):
+        self.fill()
+        key_id, key = self.pool.take(256)
+        self.assertEqual(len(key), 32)
+        self.assertEqual(self.store.get(key_id), key)
+        self.assertEqual(self.pool.stats()["hits"], 1)
+
+    def test_refills_below_half(self):
+        self.fill()
+        self.store.gate.clear()
+        self.pool.take(128)
+        self.pool.take(128)
+        time.sleep(0.05)
+        self.assertEqual(len(self.pool.pools[128]), 2)
+        self.store.gate.set()
+        self.pool.take(128)
+        wait_until(lambda: len(self.pool.pools[128]) == 4)
+
+    def test_disabled(self):
+        pool = KeyPool(self.store, size=0)
+        self.assertIsNone(pool.take(128))
+        self.assertIsNone(pool.filler_pid)
+        self.assertIsNone(self.pool.take(100))
+
+    def test_forked_worker_gets_fresh_pools(self):
+        self.fill()
+        parent_ids = {key_id for pool in self.pool.pools.values() for key_id, _ in pool}
+        with mock.patch("key_pool.os.getpid", return_value=os.getpid() + 1):
+            self.store.gate.clear()
+            self.assertIsNone(self.pool.take(128))
+            self.store.gate.set()
+            wait_until(lambda: len(self.pool.pools[128]) == 4)
+            key_id, _ = self.pool.take(128)
+        self.assertNotIn(key_id, parent_ids)
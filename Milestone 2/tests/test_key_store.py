@@ -0,0 +1,101 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+from cipher_cache import CipherCache
+from key_store import MemoryKeyStore, SQLiteKeyStore
+from lru_cache import LRUCache
+
+class TestLRUCache(unittest.TestCase):
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(2)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        cache.get("a")
+        cache.put("c", 3)
+        self.assertEqual(cache.get("a"), 1)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(len(cache), 2)
+
+    def test_entries_expire(self):
+        cache = LRUCache(2, ttl=10)
+        with mock.patch("lru_cache.time.monotonic", return_value=100.0):
+            cache.put("a", 1)
+        with mock.patch("lru_cache.time.monotonic", return_value=109.0):
+            self.assertEqual(cache.get("a"), 1)
+        with mock.patch("lru_cache.time.monotonic", return_value=110.0):
+            self.assertIsNone(cache.get("a"))
+        self.assertEqual(len(cache), 0)
+
+    def test_pop_returns_value(self):
+        cache = LRUCache(2, ttl=10)
+        cache.put("a", 1)
+        self.assertEqual(cache.pop("a"), 1)
+        self.assertIsNone(cache.pop("a"))
+
+class KeyStoreTests:
+    def test_add_get_delete(self):
+        key_id = self.store.add(b"k" * 16)
+        self.assertEqual(self.store.get(key_id), b"k" * 16)
+        self.assertIn(key_id, self.store)
+        self.assertTrue(self.store.delete(key_id))
+        self.assertIsNone(self.store.get(key_id))
+        self.assertFalse(self.store.delete(key_id))
+
+    def test_add_many_gives_unique_ids(self):
+        key_ids = self.store.add_many([b"a" * 16, b"b" * 16, b"c" * 16])
+        self.assertEqual(len(set(key_ids)), 3)
+        self.assertEqual(self.store.get(key_ids[1]), b"b" * 16)
+
+    def test_invalid_ids(self):
+        for key_id in (None, 1, "", "abc", "999", "\u00b2", "9" * 20, str(2 ** 63), "01"):
+            self.assertIsNone(self.store.get(key_id))
+        with self.assertRaises(KeyError):
+            self.store["999"]
+        self.assertFalse(self.store.rotate("\u00b2", b"a" * 16))
+        self.assertFalse(self.store.delete("9" * 20))
+
+    def test_rotate_notifies_listeners(self):
+        notified = []
+        self.store.add_listener(notified.append)
+        key_id = self.store.add(b"a" * 16)
+        self.assertTrue(self.store.rotate(key_id, b"b" * 16))
+        self.assertEqual(self.store.get(key_id), b"b" * 16)
+        self.assertEqual(notified, [key_id])
+
+    def test_cipher_cache_follows_rotation(self):
+        ciphers = CipherCache(self.store)
+        key_id = self.store.add(b"a" * 16)
+        self.assertEqual(ciphers.get(key_id).key, b"a" * 16)
+        self.store.rotate(key_id, b"b" * 16)
+        self.assertEqual(ciphers.get(key_id).key, b"b" * 16)
+        self.store.delete(key_id)
+        self.assertIsNone(ciphers.get(key_id))
+
+class TestMemoryKeyStore(KeyStoreTests, unittest.TestCase):
+    def setUp(self):
+        self.store = MemoryKeyStore()
+
+class TestSQLiteKeyStore(KeyStoreTests, unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.path = os.path.join(self.directory.name, "keys.db")
+        self.store = SQLiteKeyStore(self.path)
+
+    def test_ids_unique_across_instances(self):
+        other = SQLiteKeyStore(self.path)
+        key_ids = [self.store.add(b"a" * 16), other.add(b"b" * 16), self.store.add(b"c" * 16)]
+        self.assertEqual(len(set(key_ids)), 3)
+        self.assertEqual(other.get(key_ids[0]), b"a" * 16)
+
+    def test_rotation_by_another_worker_seen_after_ttl(self):
+        other = SQLiteKeyStore(self.path, cache_ttl=10)
+        key_id = self.store.add(b"a" * 16)
+        with mock.patch("lru_cache.time.monotonic", return_value=100.0):
+            self.assertEqual(other.get(key_id), b"a" * 16)
+        self.store.rotate(key_id, b"b" * 16)
+        with mock.patch("lru_cache.time.monotonic", return_value=105.0):
+            self.assertEqual(other.get(key_id), b"a" * 16)
+        with mock.patch("lru_cache.time.monotonic", return_value=110.0):
+            self.assertEqual(other.get(key_id), b"b" * 16)
@@ -0,0 +1,34 @@
+import gc
+import threading
+import unittest
+from metrics import Metrics
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        self.metrics = Metrics()
+
+    def test_counts_from_all_threads(self):
+        self.metrics.inc("requests_total", (("route", "/"),))
+        threads = [threading.Thread(target=self.metrics.inc, args=("requests_total", (("route", "/"),)))
+                   for _ in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.metrics.snapshot()[("requests_total", (("route", "/"),))], 21)
+
+    def test_shards_of_finished_threads_are_retired(self):
+        for _ in range(50):
+            thread = threading.Thread(target=self.metrics.observe, args=("latency", (), 0.003))
+            thread.start()
+            thread.join()
+        gc.collect()
+        histogram = self.metrics.snapshot()[("latency", ())]
+        self.assertEqual(histogram[-1], 50)
+        self.assertAlmostEqual(histogram[-2], 0.15)
+        self.assertEqual(len(self.metrics.shards), 0)
+
+    def test_timed(self):
+        timed = self.metrics.timed("double")(lambda x: 2 * x)
+        self.assertEqual(timed(2), 4)
+        self.assertEqual(self.metrics.snapshot()[("crypto_operation_duration_seconds", (("operation", "double"),))][-1], 1)
@@ -0,0 +1,99 @@
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+from flask import Flask
+from profiling import PROFILE_HEADER, header_value, install_profiling, sign, valid_header
+
+SECRET = "test-secret"
+
+def make_app(**env):
+    app = Flask(__name__)
+
+    @app.route("/encrypt")
+    def encrypt():
+        return "ok"
+
+    @app.route("/login")
+    def login():
+        return "ok"
+
+    with mock.patch.dict(os.environ, env, clear=True):
+        install_profiling(app)
+    return app
+
+class TestValidHeader(unittest.TestCase):
+    def test_valid(self):
+        self.assertTrue(valid_header(SECRET, "/encrypt", header_value(SECRET, "/encrypt", 60)))
+
+    def test_expired(self):
+        expires = int(time.time()) - 1
+        self.assertFalse(valid_header(SECRET, "/encrypt", f"{expires}.{sign(SECRET, '/encrypt', expires)}"))
+
+    def test_wrong_path(self):
+        self.assertFalse(valid_header(SECRET, "/login", header_value(SECRET, "/encrypt", 60)))
+
+    def test_bad_signature(self):
+        expires, _, signature = header_value(SECRET, "/encrypt", 60).partition(".")
+        flipped = ("0" if signature[0] != "0" else "1") + signature[1:]
+        self.assertFalse(valid_header(SECRET, "/encrypt", f"{expires}.{flipped}"))
+        self.assertFalse(valid_header("other-secret", "/encrypt", header_value(SECRET, "/encrypt", 60)))
+
+    def test_malformed(self):
+        for value in ("", "abc", "-5.abc", f"{int(time.time()) + 60}", "1e9.abc"):
+            self.assertFalse(valid_header(SECRET, "/encrypt", value))
+
+class TestInstallProfiling(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def profiles(self):
+        return os.listdir(self.directory)
+
+    def test_no_hooks_without_profile_dir(self):
+        app = make_app(PROFILE_SECRET=SECRET)
+        self.assertEqual(app.before_request_funcs, {})
+        self.assertEqual(app.after_request_funcs, {})
+        self.assertEqual(app.teardown_request_funcs, {})
+        response = app.test_client().get("/encrypt", headers={PROFILE_HEADER: header_value(SECRET, "/encrypt", 60)})
+        self.assertNotIn("X-Profile-File", response.headers)
+
+    def test_signed_header_profiles_request(self):
+        client = make_app(PROFILE_DIR=self.directory, PROFILE_SECRET=SECRET).test_client()
+        response = client.get("/encrypt", headers={PROFILE_HEADER: header_value(SECRET, "/encrypt", 60)})
+        self.assertIn(response.headers["X-Profile-File"], self.profiles())
+
+    def test_rejected_headers_do_not_profile(self):
+        client = make_app(PROFILE_DIR=self.directory, PROFILE_SECRET=SECRET).test_client()
+        expires = int(time.time()) - 1
+        for value in (f"{expires}.{sign(SECRET, '/encrypt', expires)}",
+                      header_value(SECRET, "/login", 60),
+                      header_value("other-secret", "/encrypt", 60)):
+            response = client.get("/encrypt", headers={PROFILE_HEADER: value})
+            self.assertNotIn("X-Profile-File", response.headers)
+        self.assertEqual(self.profiles(), [])
+
+    def test_header_ignored_without_secret(self):
+        client = make_app(PROFILE_DIR=self.directory).test_client()
+        response = client.get("/encrypt", headers={PROFILE_HEADER: header_value("", "/encrypt", 60)})
+        self.assertNotIn("X-Profile-File", response.headers)
+
+    def test_routes_limit_profiling(self):
+        client = make_app(PROFILE_DIR=self.directory, PROFILE_SECRET=SECRET, PROFILE_ROUTES="/login").test_client()
+        response = client.get("/encrypt", headers={PROFILE_HEADER: header_value(SECRET, "/encrypt", 60)})
+        self.assertNotIn("X-Profile-File", response.headers)
+        response = client.get("/login", headers={PROFILE_HEADER: header_value(SECRET, "/login", 60)})
+        self.assertIn("X-Profile-File", response.headers)
+
+    def test_sample_mode(self):
+        client = make_app(PROFILE_DIR=self.directory, PROFILE_MODE="sample", PROFILE_RATE="1").test_client()
+        response = client.get("/encrypt")
+        self.assertTrue(response.headers["X-Profile-File"].endswith(".collapsed"))
+        self.assertIn(response.headers["X-Profile-File"], self.profiles())
+
+    def test_unknown_mode(self):
+        with self.assertRaises(ValueError):
+            make_app(PROFILE_DIR=self.directory, PROFILE_MODE="perf")
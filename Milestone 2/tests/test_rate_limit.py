@@ -0,0 +1,52 @@
+import unittest
+from rate_limit import TokenBucketLimiter
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+class TestTokenBucketLimiter(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.limiter = TokenBucketLimiter(rate=1, burst=3, sweep_interval=60, clock=self.clock)
+
+    def test_burst_then_throttled(self):
+        for _ in range(3):
+            self.assertEqual(self.limiter.allow("alice"), (True, 0.0))
+        allowed, retry_after = self.limiter.allow("alice")
+        self.assertFalse(allowed)
+        self.assertAlmostEqual(retry_after, 1.0)
+
+    def test_tokens_refill(self):
+        for _ in range(3):
+            self.limiter.allow("alice")
+        self.clock.now = 1.0
+        self.assertTrue(self.limiter.allow("alice")[0])
+        self.assertFalse(self.limiter.allow("alice")[0])
+
+    def test_keys_are_independent(self):
+        for _ in range(3):
+            self.limiter.allow("alice")
+        self.assertTrue(self.limiter.allow("bob")[0])
+
+    def test_throttled_requests_do_not_use_tokens(self):
+        for _ in range(10):
+            self.limiter.allow("alice")
+        self.clock.now = 1.0
+        self.assertTrue(self.limiter.allow("alice")[0])
+
+    def test_sweep_drops_full_buckets(self):
+        self.limiter.allow("alice")
+        self.limiter.allow("bob")
+        self.clock.now = 61
+        self.limiter.allow("carol")
+        self.assertEqual(self.limiter.stats()["tracked_keys"], 1)
+
+    def test_disabled(self):
+        limiter = TokenBucketLimiter(rate=0, burst=1, clock=self.clock)
+        for _ in range(100):
+            self.assertEqual(limiter.allow("alice"), (True, 0.0))
+        self.assertEqual(limiter.stats()["tracked_keys"], 0)
@@ -0,0 +1,357 @@
+import base64
+import hashlib
+import os
+import signal
+import tempfile
+import unittest
+from unittest import mock
+
+# Cheap bcrypt hashed on the request thread, no login throttling, in-memory
+# stores and no docs, so importing the app writes nothing to disk
+os.environ.update({"BCRYPT_COST": "4", "BCRYPT_WORKERS": "0", "LOGIN_RATE_PER_USER": "0",
+                   "LOGIN_RATE_PER_IP": "0", "SWAGGER_MODE": "off"})
+for name in ("KEY_STORE_PATH", "USER_STORE_PATH", "METRICS_DIR", "ATTACK_DETECTOR_PATH"):
+    os.environ.pop(name, None)
+
+import cbor2
+from concurrent.futures.process import BrokenProcessPool
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+import app
+from cipher_cache import CipherCache
+from key_store import SQLiteKeyStore
+from rate_limit import TokenBucketLimiter
+from user_store import record_cost
+
+BINARY = "application/octet-stream"
+
+class RouteTestCase(unittest.TestCase):
+    def setUp(self):
+        self.client = app.app.test_client()
+
+    def generate_key(self, key_size=256):
+        response = self.client.post("/generate-key", json={"key_type": "AES", "key_size": key_size})
+        self.assertEqual(response.status_code, 200)
+        return response.json["key_id"]
+
+class TestKeys(RouteTestCase):
+    def test_generate_key(self):
+        for key_size in (128, 192, 256):
+            response = self.client.post("/generate-key", json={"key_type": "AES", "key_size": key_size})
+            self.assertEqual(len(base64.b64decode(response.json["key_value"])), key_size // 8)
+
+    def test_invalid_key_size(self):
+        response = self.client.post("/generate-key", json={"key_type": "AES", "key_size": 100})
+        self.assertEqual(response.status_code, 400)
+
+    def test_generate_key_batch(self):
+        response = self.client.post("/generate-key/batch", json={"key_type": "AES", "key_size": 128, "count": 3})
+        key_ids = [key["key_id"] for key in response.json["keys"]]
+        self.assertEqual(len(set(key_ids)), 3)
+        response = self.client.post("/generate-key/batch", json={"key_type": "AES", "key_size": 128, "count": 0})
+        self.assertEqual(response.status_code, 400)
+        with mock.patch.object(app, "MAX_BATCH_SIZE", 2):
+            response = self.client.post("/generate-key/batch", json={"key_type": "AES", "key_size": 128, "count": 3})
+        self.assertEqual(response.status_code, 413)
+
+    def test_malformed_ids_with_sqlite_store(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        ciphers = CipherCache(SQLiteKeyStore(os.path.join(directory.name, "keys.db")))
+        with mock.patch.object(app, "ciphers", ciphers):
+            for key_id in ("\u00b2", "9" * 20):
+                response = self.client.post("/encrypt", json={"key_id": key_id, "plaintext": "x", "algorithm": "AES"})
+                self.assertEqual(response.status_code, 400)
+                response = self.client.post("/encrypt/stream", query_string={"key_id": key_id, "algorithm": "AES"},
+                                            data=b"x", content_type=BINARY)
+                self.assertEqual(response.status_code, 400)
+
+class TestEncryptDecrypt(RouteTestCase):
+    def encrypt(self, key_id, plaintext, mode, **fields):
+        response = self.client.post("/encrypt", json={"key_id": key_id, "plaintext": plaintext, "algorithm": "AES",
+                                                      "mode": mode, **fields})
+        self.assertEqual(response.status_code, 200)
+        return response.json["ciphertext"]
+
+    def decrypt(self, key_id, ciphertext, mode, **fields):
+        return self.client.post("/decrypt", json={"key_id": key_id, "ciphertext": ciphertext, "algorithm": "AES",
+                                                  "mode": mode, **fields})
+
+    def test_round_trip(self):
+        for key_size in (128, 192, 256):
+            key_id = self.generate_key(key_size)
+            for mode in app.AES_MODES:
+                ciphertext = self.encrypt(key_id, "Hello, IoT!", mode)
+                response = self.decrypt(key_id, ciphertext, mode)
+                self.assertEqual(response.json, {"plaintext": "Hello, IoT!"})
+
+    def test_device_keys(self):
+        key_id = self.generate_key()
+        ciphertext = self.encrypt(key_id, "reading", "GCM", device_id="sensor-1")
+        self.assertEqual(self.decrypt(key_id, ciphertext, "GCM", device_id="sensor-1").json["plaintext"], "reading")
+        self.assertEqual(self.decrypt(key_id, ciphertext, "GCM", device_id="sensor-2").status_code, 400)
+        self.assertEqual(self.decrypt(key_id, ciphertext, "GCM").status_code, 400)
+
+    def test_tampered_gcm_ciphertext(self):
+        key_id = self.generate_key()
+        ciphertext = bytearray(base64.b64decode(self.encrypt(key_id, "Hello, IoT!", "GCM")))
+        ciphertext[-1] ^= 1
+        response = self.decrypt(key_id, base64.b64encode(ciphertext).decode(), "GCM")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json, {"error": "Invalid ciphertext"})
+
+    def test_invalid_ciphertext(self):
+        key_id = self.generate_key()
+        for ciphertext in ("not base64!", base64.b64encode(b"short").decode(), 5):
+            self.assertEqual(self.decrypt(key_id, ciphertext, "CBC").status_code, 400)
+
+    def test_invalid_requests(self):
+        key_id = self.generate_key()
+        body = {"key_id": key_id, "plaintext": "x", "algorithm": "AES", "mode": "CBC"}
+        for change in ({"key_id": "999999"}, {"algorithm": "DES"}, {"mode": "ECB"}, {"plaintext": 5}):
+            response = self.client.post("/encrypt", json={**body, **change})
+            self.assertEqual(response.status_code, 400)
+        response = self.client.post("/encrypt", data="{", content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+
+    def test_raw_body(self):
+        key_id = self.generate_key()
+        headers = {"X-Key-Id": key_id, "X-Algorithm": "AES", "X-Mode": "GCM"}
+        plaintext = os.urandom(100)
+        ciphertext = self.client.post("/encrypt", data=plaintext, content_type=BINARY, headers=headers).data
+        response = self.client.post("/decrypt", data=ciphertext, content_type=BINARY, headers=headers)
+        self.assertEqual(response.mimetype, BINARY)
+        self.assertEqual(response.data, plaintext)
+
+    def test_cbor(self):
+        key_id = self.generate_key()
+        body = {"key_id": key_id, "algorithm": "AES", "mode": "CTR"}
+        response = self.client.post("/encrypt", data=cbor2.dumps({**body, "plaintext": b"\x00\xff"}),
+                                    content_type="application/cbor")
+        ciphertext = cbor2.loads(response.data)["ciphertext"]
+        response = self.client.post("/decrypt", data=cbor2.dumps({**body, "ciphertext": ciphertext}),
+                                    content_type="application/cbor")
+        self.assertEqual(cbor2.loads(response.data), {"plaintext": b"\x00\xff"})
+
+class TestBatch(RouteTestCase):
+    def test_encrypt_decrypt_batch(self):
+        key_id = self.generate_key()
+        items = [{"key_id": key_id, "plaintext": f"message {i}", "algorithm": "AES", "mode": mode}
+                 for i, mode in enumerate(app.AES_MODES)]
+        response = self.client.post("/encrypt/batch", json={"items": items + [
+            {"key_id": "999999", "plaintext": "x", "algorithm": "AES"},
+            {"key_id": key_id, "plaintext": "x", "algorithm": "AES", "mode": "ECB"},
+            "not an item",
+        ]})
+        results = response.json["results"]
+        self.assertEqual([result.get("error") for result in results[3:]],
+                         ["Invalid key or algorithm", "Invalid mode", "Invalid item"])
+
+        tampered = bytearray(base64.b64decode(results[1]["ciphertext"]))
+        tampered[-1] ^= 1
+        decrypt_items = [{"key_id": key_id, "ciphertext": result["ciphertext"], "algorithm": "AES", "mode": item["mode"]}
+                         for item, result in zip(items, results)]
+        decrypt_items.append({**decrypt_items[1], "ciphertext": base64.b64encode(tampered).decode()})
+        response = self.client.post("/decrypt/batch", json={"items": decrypt_items})
+        self.assertEqual(response.json["results"], [{"plaintext": "message 0"}, {"plaintext": "message 1"},
+                                                    {"plaintext": "message 2"}, {"error": "Invalid ciphertext"}])
+
+    def test_batch_limits(self):
+        self.assertEqual(self.client.post("/encrypt/batch", json={"items": []}).status_code, 400)
+        self.assertEqual(self.client.post("/decrypt/batch", json={"items": "x"}).status_code, 400)
+        with mock.patch.object(app, "MAX_BATCH_SIZE", 2):
+            response = self.client.post("/encrypt/batch", json={"items": [{}, {}, {}]})
+        self.assertEqual(response.status_code, 413)
+
+    def test_verify_hash_batch(self):
+        digest = hashlib.sha256(b"hello").digest()
+        large = "x" * app.PARALLEL_HASH_MIN_SIZE
+        items = [
+            {"data": "hello", "hash_value": base64.b64encode(digest).decode()},
+            {"data": "hello", "hash_value": base64.b64encode(b"\x00" * 32).decode()},
+            {"data": "hello", "hash_value": "not base64!"},
+            {"data": large, "hash_value": base64.b64encode(hashlib.sha256(large.encode()).digest()).decode()},
+            {"data": "hello", "algorithm": "MD5", "hash_value": ""},
+            {"data": 5},
+        ]
+        response = self.client.post("/verify-hash/batch", json={"algorithm": "SHA-256", "items": items})
+        self.assertEqual(response.json["count"], 6)
+        self.assertEqual(response.json["valid_count"], 2)
+        self.assertEqual(base64.b64decode(response.json["valid"]), bytes([0b1001]))
+        self.assertEqual([error["index"] for error in response.json["errors"]], [4, 5])
+        with mock.patch.object(app, "MAX_BATCH_SIZE", 2):
+            response = self.client.post("/verify-hash/batch", json={"items": items})
+        self.assertEqual(response.status_code, 413)
+
+class TestStreams(RouteTestCase):
+    def test_stream_round_trip(self):
+        key_id = self.generate_key()
+        query = f"?key_id={key_id}&algorithm=AES"
+        for size in (0, 15, 16, 3 * app.STREAM_CHUNK_SIZE + 5):
+            plaintext = os.urandom(size)
+            ciphertext = self.client.post("/encrypt/stream" + query, data=plaintext, content_type=BINARY).data
+            self.assertEqual(len(ciphertext), 16 + (size // 16 + 1) * 16)
+            response = self.client.post("/decrypt/stream" + query, data=ciphertext, content_type=BINARY)
+            self.assertEqual(response.data, plaintext)
+
+    def test_stream_invalid_length(self):
+        key_id = self.generate_key()
+        for ciphertext in (b"", os.urandom(16), os.urandom(40)):
+            response = self.client.post(f"/decrypt/stream?key_id={key_id}&algorithm=AES", data=ciphertext,
+                                        content_type=BINARY)
+            self.assertEqual(response.status_code, 400)
+
+    def test_stream_invalid_padding(self):
+        # A block that decrypts to zeros has no valid PKCS7 padding
+        key_id = self.generate_key()
+        iv = os.urandom(16)
+        encryptor = Cipher(algorithms.AES(app.keys.get(key_id)), modes.CBC(iv)).encryptor()
+        ciphertext = iv + encryptor.update(b"\x00" * 32) + encryptor.finalize()
+        # The error reaches the server, which drops the connection instead of
+        # ending the chunked response normally
+        with self.assertLogs(app.app.logger, "WARNING"), self.assertRaises(ValueError):
+            self.client.post(f"/decrypt/stream?key_id={key_id}&algorithm=AES", data=ciphertext,
+                             content_type=BINARY).get_data()
+
+    def test_stream_unknown_key(self):
+        response = self.client.post("/encrypt/stream?key_id=999999&algorithm=AES", data=b"x", content_type=BINARY)
+        self.assertEqual(response.status_code, 400)
+
+class TestChunked(RouteTestCase):
+    def test_chunked_round_trip(self):
+        key_id = self.generate_key()
+        query = f"?key_id={key_id}&algorithm=AES"
+        plaintext = os.urandom(5000)
+        ciphertext = self.client.post("/encrypt/chunked" + query + "&chunk_size=1024", data=plaintext,
+                                      content_type=BINARY).data
+        response = self.client.post("/decrypt/chunked" + query, data=ciphertext, content_type=BINARY)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, plaintext)
+
+    def test_chunked_tampered(self):
+        key_id = self.generate_key()
+        query = f"?key_id={key_id}&algorithm=AES"
+        ciphertext = bytearray(self.client.post("/encrypt/chunked" + query, data=b"secret",
+                                                content_type=BINARY).data)
+        for tampered in (ciphertext[:-1], ciphertext[:10], ciphertext[:-1] + bytes([ciphertext[-1] ^ 1])):
+            response = self.client.post("/decrypt/chunked" + query, data=bytes(tampered), content_type=BINARY)
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.json, {"error": "Invalid ciphertext"})
+
+    def test_chunked_invalid_chunk_size(self):
+        key_id = self.generate_key()
+        for chunk_size in ("abc", "1", "-5"):
+            response = self.client.post(f"/encrypt/chunked?key_id={key_id}&algorithm=AES&chunk_size={chunk_size}",
+                                        data=b"secret", content_type=BINARY)
+            self.assertEqual(response.status_code, 400)
+
+class TestHashes(RouteTestCase):
+    def test_generate_and_verify(self):
+        for algorithm in ("SHA-256", "SHA3-512", "BLAKE2b"):
+            response = self.client.post("/generate-hash", json={"data": "hello", "algorithm": algorithm})
+            hash_value = response.json["hash_value"]
+            response = self.client.post("/verify-hash", json={"data": "hello", "hash_value": hash_value,
+                                                              "algorithm": algorithm})
+            self.assertTrue(response.json["is_valid"])
+            response = self.client.post("/verify-hash", json={"data": "hellO", "hash_value": hash_value,
+                                                              "algorithm": algorithm})
+            self.assertFalse(response.json["is_valid"])
+
+    def test_raw_body(self):
+        data = os.urandom(100000)
+        response = self.client.post("/generate-hash?algorithm=SHA-512", data=data, content_type=BINARY)
+        self.assertEqual(base64.b64decode(response.json["hash_value"]), hashlib.sha512(data).digest())
+        response = self.client.post("/verify-hash?algorithm=SHA-512", data=data, content_type=BINARY,
+                                    headers={"X-Hash-Value": response.json["hash_value"]})
+        self.assertTrue(response.json["is_valid"])
+
+    def test_unsupported_algorithm(self):
+        response = self.client.post("/generate-hash", json={"data": "hello", "algorithm": "MD5"})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post("/verify-hash", json={"data": "hello", "hash_value": "", "algorithm": "MD5"})
+        self.assertEqual(response.status_code, 400)
+
+class TestUsers(RouteTestCase):
+    def register(self, username, password="correct horse"):
+        return self.client.post("/register", json={"username": username, "password": password})
+
+    def login(self, username, password="correct horse"):
+        return self.client.post("/login", json={"username": username, "password": password})
+
+    def test_register_and_login(self):
+        self.assertEqual(self.register("alice").status_code, 201)
+        self.assertEqual(self.register("alice").status_code, 409)
+        self.assertEqual(self.login("alice").status_code, 200)
+        self.assertEqual(self.login("alice", "wrong").status_code, 401)
+        self.assertEqual(self.login("nobody").status_code, 404)
+
+    def test_missing_fields(self):
+        self.assertEqual(self.client.post("/register", json={"username": "bob"}).status_code, 400)
+
+    def test_rehash_on_login(self):
+        self.register("carol")
+        self.assertEqual(record_cost(app.users.get("carol")), 4)
+        with mock.patch.object(app, "bcrypt_cost", 5):
+            self.assertEqual(self.login("carol").status_code, 200)
+            app.rehash_executor.submit(lambda: None).result()
+        self.assertEqual(record_cost(app.users.get("carol")), 5)
+        self.assertEqual(self.login("carol").status_code, 200)
+    def test_login_throttled(self):
+        self.register("dave")
+        with mock.patch.object(app, "login_user_limiter", TokenBucketLimiter(rate=0.01, burst=2)):
+            self.assertEqual(self.login("dave").status_code, 200)
+            self.assertEqual(self.login("dave", "wrong").status_code, 401)
+            response = self.login("dave")
+            self.assertEqual(response.status_code, 429)
+            self.assertGreater(int(response.headers["Retry-After"]), 0)
+
+    def test_login_events_recorded(self):
+        self.register("frank")
+        with mock.patch.object(app.security_events, "record") as record:
+            self.login("frank")
+            self.login("frank", "wrong")
+            self.login("nobody")
+        self.assertEqual([(call.args[0], call.args[1]) for call in record.call_args_list],
+                         [("user_login", "frank"), ("login_failed", "frank"), ("login_failed", "nobody")])
+
+class TestBcryptPool(unittest.TestCase):
+    def setUp(self):
+        workers = mock.patch.object(app, "BCRYPT_WORKERS", 1)
+        workers.start()
+        self.addCleanup(workers.stop)
+        app.bcrypt_pool_pid = None
+        self.addCleanup(self.shutdown_pool)
+
+    def shutdown_pool(self):
+        if app.bcrypt_pool is not None:
+            app.bcrypt_pool.shutdown()
+        app.bcrypt_pool = app.bcrypt_pool_pid = None
+
+    def test_runs_in_pool_process(self):
+        self.assertNotEqual(app.run_bcrypt(os.getpid), os.getpid())
+        self.assertEqual(app.bcrypt_pool._mp_context.get_start_method(), app.BCRYPT_START_METHOD)
+        self.assertNotEqual(app.BCRYPT_START_METHOD, "fork")
+
+    @unittest.skipUnless(hasattr(signal, "SIGKILL"), "needs SIGKILL")
+    def test_dead_process_replaced(self):
+        pid = app.run_bcrypt(os.getpid)
+        broken = app.bcrypt_pool
+        os.kill(pid, signal.SIGKILL)
+        with self.assertLogs(app.app.logger, "WARNING"):
+            self.assertNotEqual(app.run_bcrypt(os.getpid), pid)
+        self.assertIsNot(app.bcrypt_pool, broken)
+
+    def test_busy_when_pool_keeps_breaking(self):
+        pool = mock.Mock()
+        pool.submit.side_effect = BrokenProcessPool()
+        with mock.patch.object(app, "get_bcrypt_pool", return_value=pool), self.assertLogs(app.app.logger, "WARNING"):
+            response = app.app.test_client().post("/register", json={"username": "erin", "password": "secret"})
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(pool.submit.call_count, 2)
+
+class TestStatus(RouteTestCase):
+    def test_metrics_and_status(self):
+        self.generate_key()
+        response = self.client.get("/metrics")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b"http_requests_total", response.data)
+        self.assertEqual(self.client.get("/status").json["bcrypt"]["cost"], 4)
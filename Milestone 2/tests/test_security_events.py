@@ -0,0 +1,72 @@
+import threading
+import time
+import unittest
+from metrics import Metrics
+from security_events import SecurityEvents
+
+class StubDetector:
+    # instrument() waits for the gate, so a test controls when the consumer
+    # gets through the queue; events named "bad" raise, "attack" are attacks
+    def __init__(self):
+        self.gate = threading.Event()
+        self.gate.set()
+        self.started = threading.Event()
+        self.events = []
+
+    def instrument(self, event_name, user_role, user_id, source_id, timestamp, context):
+        self.started.set()
+        self.gate.wait()
+        self.events.append((event_name, user_id, source_id, context))
+        if event_name == "bad":
+            raise RuntimeError("detector failed")
+        return event_name == "attack"
+
+def wait_until(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise AssertionError("Timed out")
+        time.sleep(0.001)
+
+class TestSecurityEvents(unittest.TestCase):
+    def setUp(self):
+        self.detector = StubDetector()
+        self.metrics = Metrics()
+        self.events = SecurityEvents(self.detector, self.metrics, queue_size=2)
+
+    def count(self, event_name, outcome):
+        return self.metrics.snapshot().get(("security_events_total", (("event", event_name), ("outcome", outcome))), 0)
+
+    def test_events_reach_detector(self):
+        self.events.record("user_login", "alice", "10.0.0.1", {"ip_address": "10.0.0.1"})
+        self.events.record("attack", "mallory", "10.0.0.2")
+        wait_until(lambda: len(self.detector.events) == 2)
+        self.assertEqual(self.detector.events[0], ("user_login", "alice", "10.0.0.1", {"ip_address": "10.0.0.1"}))
+        wait_until(lambda: self.count("attack", "attack") == 1)
+        self.assertEqual(self.count("user_login", "ok"), 1)
+
+    def test_full_queue_drops_and_counts(self):
+        self.detector.gate.clear()
+        self.events.record("user_login", "alice", "10.0.0.1")
+        self.assertTrue(self.detector.started.wait(5))
+        # The consumer is stuck on the first event and the queue holds two
+        for _ in range(4):
+            self.events.record("login_failed", "alice", "10.0.0.1")
+        self.assertEqual(self.count("login_failed", "dropped"), 2)
+        self.assertEqual(self.events.stats()["queued"], 2)
+        self.detector.gate.set()
+        wait_until(lambda: self.count("login_failed", "ok") == 2)
+        self.assertEqual(len(self.detector.events), 3)
+
+    def test_failing_detector_keeps_consumer_running(self):
+        self.events.record("bad", "alice", "10.0.0.1")
+        self.events.record("user_login", "alice", "10.0.0.1")
+        wait_until(lambda: self.count("user_login", "ok") == 1)
+        self.assertEqual(self.count("bad", "error"), 1)
+
+    def test_disabled_without_detector(self):
+        events = SecurityEvents(None, self.metrics)
+        events.record("user_login", "alice", "10.0.0.1")
+        self.assertFalse(events.enabled)
+        self.assertIsNone(events.queue)
+        self.assertEqual(events.stats()["queued"], 0)
@@ -0,0 +1,40 @@
+import os
+import tempfile
+import threading
+import unittest
+from unittest import mock
+from sqlite_connections import SQLiteConnections
+
+class TestSQLiteConnections(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.db = SQLiteConnections(os.path.join(self.directory.name, "test.db"),
+                                    "CREATE TABLE IF NOT EXISTS items (name TEXT PRIMARY KEY)")
+
+    def test_wal_and_schema(self):
+        conn = self.db.connect()
+        self.assertEqual(conn.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+        self.assertEqual(conn.execute("SELECT COUNT(*) FROM items").fetchone()[0], 0)
+
+    def test_one_connection_per_thread(self):
+        self.assertIs(self.db.connect(), self.db.connect())
+        other = []
+        thread = threading.Thread(target=lambda: other.append(self.db.connect()))
+        thread.start()
+        thread.join()
+        self.assertIsNot(other[0], self.db.connect())
+
+    def test_new_connection_after_fork(self):
+        conn = self.db.connect()
+        with mock.patch("sqlite_connections.os.getpid", return_value=os.getpid() + 1):
+            self.assertIsNot(self.db.connect(), conn)
+
+    def test_writes_seen_by_other_threads(self):
+        with self.db.connect() as conn:
+            conn.execute("INSERT INTO items (name) VALUES ('a')")
+        names = []
+        thread = threading.Thread(target=lambda: names.extend(self.db.connect().execute("SELECT name FROM items")))
+        thread.start()
+        thread.join()
+        self.assertEqual(names, [("a",)])
@@ -0,0 +1,79 @@
+import base64
+import os
+import tempfile
+import unittest
+import bcrypt
+from user_store import (RECORD_SIZE, MemoryUserStore, SQLiteUserStore, from_legacy, import_legacy, pack_hash,
+                        record_cost, unpack_hash)
+
+class TestHashRecords(unittest.TestCase):
+    def setUp(self):
+        self.hashed = bcrypt.hashpw(b"password", bcrypt.gensalt(4))
+
+    def test_pack_round_trip(self):
+        record = pack_hash(self.hashed)
+        self.assertEqual(len(record), RECORD_SIZE)
+        self.assertEqual(unpack_hash(record), self.hashed)
+        self.assertEqual(record_cost(record), 4)
+        self.assertTrue(bcrypt.checkpw(b"password", unpack_hash(record)))
+
+    def test_rejects_other_formats(self):
+        for value in (b"", b"password", b"$2b$04$short", self.hashed[:-1], self.hashed.replace(b"$04$", b"$xx$")):
+            with self.assertRaises(ValueError):
+                pack_hash(value)
+
+    def test_rejects_non_canonical_hash(self):
+        # The last salt character carries 4 unused bits; bcrypt itself never sets them
+        last = self.hashed[28:29]
+        alphabet = b"./ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789"
+        non_canonical = alphabet[alphabet.index(last) ^ 1:][:1]
+        with self.assertRaises(ValueError):
+            pack_hash(self.hashed[:28] + non_canonical + self.hashed[29:])
+
+    def test_from_legacy(self):
+        salt = bcrypt.gensalt(4)
+        legacy = base64.b64encode(salt + bcrypt.hashpw(b"password", salt)).decode()
+        record = from_legacy(legacy)
+        self.assertTrue(bcrypt.checkpw(b"password", unpack_hash(record)))
+        self.assertFalse(bcrypt.checkpw(b"wrong", unpack_hash(record)))
+
+class UserStoreTests:
+    def test_add_and_get(self):
+        record = pack_hash(bcrypt.hashpw(b"password", bcrypt.gensalt(4)))
+        self.assertTrue(self.store.add("alice", record))
+        self.assertFalse(self.store.add("alice", record))
+        self.assertEqual(self.store.get("alice"), record)
+        self.assertIsNone(self.store.get("bob"))
+        self.assertIn("alice", self.store)
+        self.assertEqual(len(self.store), 1)
+
+    def test_replace_only_if_unchanged(self):
+        old = pack_hash(bcrypt.hashpw(b"password", bcrypt.gensalt(4)))
+        new = pack_hash(bcrypt.hashpw(b"password", bcrypt.gensalt(5)))
+        self.store.add("alice", old)
+        self.assertTrue(self.store.replace("alice", old, new))
+        self.assertFalse(self.store.replace("alice", old, old))
+        self.assertEqual(self.store.get("alice"), new)
+
+    def test_import_legacy(self):
+        salt = bcrypt.gensalt(4)
+        legacy = base64.b64encode(salt + bcrypt.hashpw(b"password", salt)).decode()
+        self.store.add("alice", pack_hash(bcrypt.hashpw(b"other", bcrypt.gensalt(4))))
+        self.assertEqual(import_legacy(self.store, {"alice": legacy, "bob": legacy}), 1)
+        self.assertTrue(bcrypt.checkpw(b"password", unpack_hash(self.store.get("bob"))))
+        self.assertFalse(bcrypt.checkpw(b"password", unpack_hash(self.store.get("alice"))))
+
+class TestMemoryUserStore(UserStoreTests, unittest.TestCase):
+    def setUp(self):
+        self.store = MemoryUserStore()
+
+class TestSQLiteUserStore(UserStoreTests, unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.store = SQLiteUserStore(os.path.join(self.directory.name, "users.db"))
+
+    def test_shared_between_instances(self):
+        record = pack_hash(bcrypt.hashpw(b"password", bcrypt.gensalt(4)))
+        self.store.add("alice", record)
+        self.assertEqual(SQLiteUserStore(self.store.path).get("alice"), record)
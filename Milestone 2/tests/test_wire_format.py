@@ -0,0 +1,54 @@
+import unittest
+import cbor2
+from flask import Flask
+from wire_format import (BINARY_MIMETYPE, CBOR_MIMETYPE, JSON_MIMETYPE, as_bytes, binary_value, header_name,
+                         read_envelope, response_mimetype)
+
+class TestWireFormat(unittest.TestCase):
+    def setUp(self):
+        self.app = Flask(__name__)
+
+    def read(self, **kwargs):
+        with self.app.test_request_context("/", method="POST", **kwargs):
+            return read_envelope("plaintext", ["key_id", "mode"])
+
+    def test_header_name(self):
+        self.assertEqual(header_name("key_id"), "X-Key-Id")
+        self.assertEqual(header_name("mode"), "X-Mode")
+
+    def test_binary_value(self):
+        self.assertEqual(binary_value(b"\x00\x01"), b"\x00\x01")
+        self.assertEqual(binary_value("AAE="), b"\x00\x01")
+        for value in ("not base64!", None, 1):
+            with self.assertRaises(ValueError):
+                binary_value(value)
+
+    def test_as_bytes(self):
+        self.assertEqual(as_bytes("hi"), b"hi")
+        self.assertEqual(as_bytes(b"hi"), b"hi")
+        self.assertIsNone(as_bytes(1))
+
+    def test_read_json(self):
+        self.assertEqual(self.read(json={"key_id": "1"}), {"key_id": "1"})
+        self.assertIsNone(self.read(json=[1, 2]))
+        self.assertIsNone(self.read(data="{", content_type=JSON_MIMETYPE))
+
+    def test_read_cbor(self):
+        data = self.read(data=cbor2.dumps({"key_id": "1", "plaintext": b"\x00"}), content_type=CBOR_MIMETYPE)
+        self.assertEqual(data, {"key_id": "1", "plaintext": b"\x00"})
+        self.assertIsNone(self.read(data=b"\xff\xff", content_type=CBOR_MIMETYPE))
+        self.assertIsNone(self.read(data=cbor2.dumps([1]), content_type=CBOR_MIMETYPE))
+
+    def test_read_raw_body(self):
+        data = self.read(data=b"\x00\x01", content_type=BINARY_MIMETYPE, headers={"X-Key-Id": "1"})
+        self.assertEqual(data, {"key_id": "1", "plaintext": b"\x00\x01"})
+
+    def test_response_mimetype(self):
+        with self.app.test_request_context("/", method="POST", content_type=CBOR_MIMETYPE):
+            self.assertEqual(response_mimetype(), CBOR_MIMETYPE)
+        with self.app.test_request_context("/", method="POST", content_type=BINARY_MIMETYPE):
+            self.assertEqual(response_mimetype(), BINARY_MIMETYPE)
+            self.assertEqual(response_mimetype(raw_default=False), JSON_MIMETYPE)
+        with self.app.test_request_context("/", method="POST", content_type=JSON_MIMETYPE,
+                                           headers={"Accept": CBOR_MIMETYPE}):
+            self.assertEqual(response_mimetype(), CBOR_MIMETYPE)
@@ -0,0 +1,133 @@
+import argparse
+import base64
+import json
+import os
+import threading
+
+from sqlite_connections import SQLiteConnections
+
+# A bcrypt hash such as b"$2b$12$" + 22 characters of salt + 31 characters of
+# digest is kept as a 41-byte record: the version letter, the cost, the
+# 16-byte salt and the 23-byte digest
+RECORD_SIZE = 41
+
+BCRYPT_ALPHABET = b"./ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789"
+BASE64_ALPHABET = b"ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/"
+TO_BASE64 = bytes.maketrans(BCRYPT_ALPHABET, BASE64_ALPHABET)
+TO_BCRYPT = bytes.maketrans(BASE64_ALPHABET, BCRYPT_ALPHABET)
+
+def bcrypt_b64decode(data):
+    # bcrypt uses its own base64 alphabet and no padding
+    return base64.b64decode(data.translate(TO_BASE64) + b"=" * (-len(data) % 4), validate=True)
+
+def bcrypt_b64encode(data):
+    return base64.b64encode(data).rstrip(b"=").translate(TO_BCRYPT)
+
+def pack_hash(hashed):
+    parts = hashed.split(b"$")
+    if len(parts) != 4 or parts[0] or len(parts[1]) != 2 or not parts[2].isdigit() or len(parts[3]) != 53:
+        raise ValueError("Not a bcrypt hash")
+    record = (parts[1][1:] + bytes([int(parts[2])]) +
+              bcrypt_b64decode(parts[3][:22]) + bcrypt_b64decode(parts[3][22:]))
+    # Only canonical encodings survive the round trip; bcrypt always
+    # produces those
+    if unpack_hash(record) != hashed:
+        raise ValueError("Not a canonical bcrypt hash")
+    return record
+
+def unpack_hash(record):
+    return (b"$2" + record[:1] + b"$%02d$" % record[1] +
+            bcrypt_b64encode(record[2:18]) + bcrypt_b64encode(record[18:]))
+
+def record_cost(record):
+    return record[1]
+
+def from_legacy(stored_hash):
+    # Before the user store, passwords were kept as base64(salt + bcrypt hash)
+    return pack_hash(base64.b64decode(stored_hash)[29:])
+
+class MemoryUserStore:
+    # The default without USER_STORE_PATH: each worker has its own users,
+    # and they are gone after a restart.
+    def __init__(self):
+        self.users = {}
+        self.lock = threading.Lock()
+
+    def get(self, username):
+        return self.users.get(username)
+
+    def add(self, username, record):
+        with self.lock:
+            if username in self.users:
+                return False
+            self.users[username] = record
+        return True
+
+    def replace(self, username, old_record, new_record):
+        # Only succeeds if the record was not changed in the meantime
+        with self.lock:
+            if self.users.get(username) != old_record:
+                return False
+            self.users[username] = new_record
+        return True
+
+    def __contains__(self, username):
+        return username in self.users
+
+    def __len__(self):
+        return len(self.users)
+
+class SQLiteUserStore:
+    # Users are shared by every worker and survive restarts. Lookups go
+    # through the primary key index, so nothing is loaded up front.
+    def __init__(self, path):
+        self.path = path
+        self.db = SQLiteConnections(
+            path,
+            "CREATE TABLE IF NOT EXISTS users ("
+            "username TEXT PRIMARY KEY, "
+            "hash BLOB NOT NULL) WITHOUT ROWID"
+        )
+
+    def get(self, username):
+        row = self.db.connect().execute("SELECT hash FROM users WHERE username = ?", (username,)).fetchone()
+        return bytes(row[0]) if row else None
+
+    def add(self, username, record):
+        with self.db.connect() as conn:
+            return conn.execute("INSERT OR IGNORE INTO users (username, hash) VALUES (?, ?)",
+                                (username, record)).rowcount > 0
+
+    def replace(self, username, old_record, new_record):
+        with self.db.connect() as conn:
+            return conn.execute("UPDATE users SET hash = ? WHERE username = ? AND hash = ?",
+                                (new_record, username, old_record)).rowcount > 0
+
+    def __contains__(self, username):
+        return self.db.connect().execute("SELECT 1 FROM users WHERE username = ?", (username,)).fetchone() is not None
+
+    def __len__(self):
+        return self.db.connect().execute("SELECT COUNT(*) FROM users").fetchone()[0]
+
+def create_user_store():
+    path = os.environ.get("USER_STORE_PATH")
+    if path:
+        return SQLiteUserStore(path)
+    return MemoryUserStore()
+
+def import_legacy(store, legacy_users):
+    imported = 0
+    for username, stored_hash in legacy_users.items():
+        imported += store.add(username, from_legacy(stored_hash))
+    return imported
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Import users exported in the old base64(salt + hash) format")
+    parser.add_argument("legacy_file", help='JSON object of {"username": "stored hash"}')
+    args = parser.parse_args()
+
+    with open(args.legacy_file) as f:
+        legacy_users = json.load(f)
+    store = create_user_store()
+    imported = import_legacy(store, legacy_users)
+    print(f"Imported {imported} of {len(legacy_users)} users")
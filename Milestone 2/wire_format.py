@@ -0,0 +1,80 @@
+import base64
+
+from flask import Response, jsonify, request
+
+# CBOR support is optional; without cbor2 installed only JSON and raw bodies
+# are accepted
+try:
+    import cbor2
+except ImportError:
+    cbor2 = None
+
+JSON_MIMETYPE = "application/json"
+CBOR_MIMETYPE = "application/cbor"
+BINARY_MIMETYPE = "application/octet-stream"
+
+def header_name(field):
+    # key_id -> X-Key-Id
+    return "X-" + "-".join(part.capitalize() for part in field.split("_"))
+
+def read_envelope(body_field=None, header_fields=()):
+    # Returns the request parameters as a dict, or None if the body cannot be
+    # decoded. Binary values are base64 strings in JSON and byte strings in
+    # CBOR. A raw body becomes body_field, with the other parameters taken
+    # from X-* headers.
+    if request.mimetype == BINARY_MIMETYPE and body_field:
+        data = {field: request.headers[header_name(field)]
+                for field in header_fields if header_name(field) in request.headers}
+        data[body_field] = request.get_data()
+        return data
+
+    if request.mimetype == CBOR_MIMETYPE:
+        if cbor2 is None:
+            return None
+        try:
+            data = cbor2.loads(request.get_data())
+        except cbor2.CBORDecodeError:
+            return None
+        return data if isinstance(data, dict) else None
+
+    data = request.get_json(silent=True)
+    return data if isinstance(data, dict) else None
+
+def invalid_body():
+    if request.mimetype == CBOR_MIMETYPE and cbor2 is None:
+        return jsonify({"error": "CBOR is not supported by this server"}), 415
+    return jsonify({"error": "Invalid request body"}), 400
+
+def response_mimetype(raw_default=True):
+    # The client's Accept header decides; otherwise answer in the format of
+    # the request (raw requests get a JSON answer when raw_default is False)
+    default = JSON_MIMETYPE
+    if request.mimetype == CBOR_MIMETYPE or (request.mimetype == BINARY_MIMETYPE and raw_default):
+        default = request.mimetype
+    offered = [default] + [mimetype for mimetype in (JSON_MIMETYPE, CBOR_MIMETYPE, BINARY_MIMETYPE)
+                           if mimetype != default and (mimetype != CBOR_MIMETYPE or cbor2 is not None)]
+    return request.accept_mimetypes.best_match(offered, default=default)
+
+def as_bytes(value):
+    if isinstance(value, str):
+        return value.encode()
+    if isinstance(value, bytes):
+        return value
+    return None
+
+def binary_value(value):
+    # Raises ValueError for anything that is neither bytes nor valid base64
+    if isinstance(value, bytes):
+        return value
+    if isinstance(value, str):
+        return base64.b64decode(value, validate=True)
+    raise ValueError("Expected bytes or a base64 string")
+
+def encode_response(fields, mimetype, raw):
+    # raw is the whole body for application/octet-stream responses
+    if mimetype == BINARY_MIMETYPE:
+        return Response(raw, mimetype=BINARY_MIMETYPE)
+    if mimetype == CBOR_MIMETYPE:
+        return Response(cbor2.dumps(fields), mimetype=CBOR_MIMETYPE)
+    return jsonify({name: base64.b64encode(value).decode('utf-8') if isinstance(value, bytes) else value
+                    for name, value in fields.items()})
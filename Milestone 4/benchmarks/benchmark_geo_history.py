@@ -0,0 +1,83 @@
+import argparse
+import time
+from datetime import datetime, timedelta
+
+from smart_home_security import TravelHistory
+
+LOGINS_PER_DAY = [24, 240, 2400, 24000]
+# GeoIP city-level locations of two offices about 100 m apart
+HOUSEHOLD = [(51.5074, -0.1278), (51.5080, -0.1290)]
+
+class LegacyHistory:
+    """The 24-hour list GeoAnomalyDetector scanned and rebuilt before TravelHistory"""
+    def __init__(self, max_speed_kmh: float):
+        self.max_speed_kmh = max_speed_kmh
+        self.points = {}
+
+    def _calculate_distance(self, lat1, lon1, lat2, lon2):
+        from math import radians, sin, cos, sqrt, atan2
+
+        R = 6371.0
+
+        lat1, lon1, lat2, lon2 = map(radians, [lat1, lon1, lat2, lon2])
+        dlat = lat2 - lat1
+        dlon = lon2 - lon1
+
+        a = sin(dlat/2)**2 + cos(lat1) * cos(lat2) * sin(dlon/2)**2
+        c = 2 * atan2(sqrt(a), sqrt(1-a))
+
+        return R * c
+
+    def check(self, key, timestamp, lat, lon):
+        if key not in self.points:
+            self.points[key] = []
+
+        violation = None
+        for prev_time, prev_lat, prev_lon in self.points[key]:
+            time_diff = (timestamp - prev_time).total_seconds() / 3600
+            if time_diff <= 0:
+                continue
+            distance = self._calculate_distance(prev_lat, prev_lon, lat, lon)
+            speed = distance / time_diff
+            if speed > self.max_speed_kmh:
+                violation = (distance, time_diff, speed)
+                break
+
+        self.points[key].append((timestamp, lat, lon))
+        self.points[key] = [
+            loc for loc in self.points[key]
+            if (timestamp - loc[0]) < timedelta(hours=24)
+        ]
+        return violation
+
+def per_login_us(history, logins_per_day, logins):
+    # A shared service account logging in from a few nearby offices: a day of
+    # logins fills the history, then every new login is timed
+    step = timedelta(days=1) / logins_per_day
+    start = datetime(2025, 1, 1)
+    day = [(start + step * i, *HOUSEHOLD[i % len(HOUSEHOLD)]) for i in range(logins_per_day)]
+    if isinstance(history, LegacyHistory):
+        # Filling the legacy history through check() would be quadratic
+        history.points["service"] = day
+    else:
+        for timestamp, lat, lon in day:
+            history.check("service", timestamp, lat, lon)
+    events = [(start + step * (logins_per_day + i), *HOUSEHOLD[i % len(HOUSEHOLD)]) for i in range(logins)]
+
+    begin = time.perf_counter()
+    for timestamp, lat, lon in events:
+        history.check("service", timestamp, lat, lon)
+    return (time.perf_counter() - begin) / logins * 1e6
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Per-login cost of the impossible-travel check")
+    parser.add_argument("--logins", type=int, default=2000, help="logins measured per rate")
+    args = parser.parse_args()
+
+    print(f"{'logins/day':>10} {'legacy us/login':>16} {'pruned us/login':>16}")
+    for logins_per_day in LOGINS_PER_DAY:
+        # The legacy check scans the whole day, so it gets fewer logins
+        legacy_logins = max(50, args.logins * 240 // logins_per_day)
+        legacy = per_login_us(LegacyHistory(900), logins_per_day, min(args.logins, legacy_logins))
+        pruned = per_login_us(TravelHistory(900), logins_per_day, args.logins)
+        print(f"{logins_per_day:>10} {legacy:>16.1f} {pruned:>16.1f}")
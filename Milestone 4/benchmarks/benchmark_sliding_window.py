@@ -0,0 +1,48 @@
+import argparse
+import time
+from datetime import datetime, timedelta
+
+from smart_home_security import SlidingWindowCounter
+
+OCCUPANCIES = [10, 100, 1000, 10000]
+WINDOW = timedelta(minutes=1)
+
+class LegacyWindow:
+    """The list-rebuilding window the rate detectors used before SlidingWindowCounter"""
+    def __init__(self, time_window: timedelta):
+        self.time_window = time_window
+        self.events = {}
+
+    def add(self, key, timestamp):
+        if key not in self.events:
+            self.events[key] = []
+        self.events[key].append(timestamp)
+        self.events[key] = [t for t in self.events[key] if timestamp - t <= self.time_window]
+        return len(self.events[key])
+
+def per_event_ns(window, occupancy, events):
+    # Fill the window with `occupancy` events, then keep it at that size: every
+    # new event pushes exactly one old event out of the window
+    step = WINDOW / occupancy
+    start = datetime(2025, 1, 1)
+    for i in range(occupancy):
+        window.add("device", start + step * i)
+    timestamps = [start + step * (occupancy + i) for i in range(events)]
+
+    begin = time.perf_counter()
+    for timestamp in timestamps:
+        window.add("device", timestamp)
+    return (time.perf_counter() - begin) / events * 1e9
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Per-event cost of the sliding window as its occupancy grows")
+    parser.add_argument("--events", type=int, default=20000, help="events measured per occupancy")
+    args = parser.parse_args()
+
+    print(f"{'occupancy':>10} {'legacy ns/event':>16} {'deque ns/event':>15}")
+    for occupancy in OCCUPANCIES:
+        # The legacy window is quadratic overall, so it gets fewer events
+        legacy_events = max(100, args.events * 10 // occupancy)
+        legacy = per_event_ns(LegacyWindow(WINDOW), occupancy, min(args.events, legacy_events))
+        counter = per_event_ns(SlidingWindowCounter(WINDOW), occupancy, args.events)
+        print(f"{occupancy:>10} {legacy:>16.0f} {counter:>15.0f}")
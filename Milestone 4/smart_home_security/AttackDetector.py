@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import Dict, Any, Set
+from typing import Dict, Any, Set, Optional
 
 from smart_home_security.detectors.PowerAnomalyDetector import PowerAnomalyDetector
 from smart_home_security.detectors.UnauthorizedAccessDetector import UnauthorizedAccessDetector
@@ -11,8 +11,9 @@ from smart_home_security.detectors.ToggleSpamDetector import ToggleSpamDetector
 from smart_home_security.EventLogger import EventLogger
 
 class AttackDetector:
-    def __init__(self):
-        self.logger = EventLogger()
+    def __init__(self, log_file: str = "logs.json", geoip_db_path: Optional[str] = None,
+                 geoip_mode: Optional[str] = None):
+        self.logger = EventLogger(log_file)
         
         # Initialize all detectors
         self.power_anomaly_detector = PowerAnomalyDetector()
@@ -21,8 +22,12 @@ class AttackDetector:
         self.password_reset_detector = PasswordResetDetector()
         self.failed_login_detector = FailedLoginDetector()
         self.toggle_spam_detector = ToggleSpamDetector()
+        geo_options = {"geoip_db_path": geoip_db_path} if geoip_db_path else {}
+        if geoip_mode:
+            geo_options["geoip_mode"] = geoip_mode
         self.geo_anomaly_detector = GeoAnomalyDetector(
-            blacklist_countries={'KP', 'SY', 'IR', 'CU'}
+            blacklist_countries={'KP', 'SY', 'IR', 'CU'},
+            **geo_options
         )
     
     
@@ -0,0 +1,41 @@
+import math
+from typing import Optional
+
+class RunningStats:
+    __slots__ = ("alpha", "count", "mean", "m2")
+
+    def __init__(self, window: Optional[int] = None):
+        """
+        Mean and variance of a stream of values in constant memory.
+
+        Without a window every value weighs the same (Welford's algorithm).
+        With a window the statistics are exponentially weighted with
+        alpha = 2 / (window + 1), so roughly the last `window` values count.
+        """
+        self.alpha = 2 / (window + 1) if window else None
+        self.count = 0
+        self.mean = 0.0
+        # Sum of squared deviations for Welford, the variance itself for EWMA
+        self.m2 = 0.0
+
+    def update(self, value: float):
+        self.count += 1
+        delta = value - self.mean
+        if self.alpha is None:
+            self.mean += delta / self.count
+            self.m2 += delta * (value - self.mean)
+        elif self.count == 1:
+            self.mean = value
+        else:
+            self.mean += self.alpha * delta
+            self.m2 = (1 - self.alpha) * (self.m2 + self.alpha * delta * delta)
+
+    @property
+    def variance(self) -> float:
+        if self.alpha is not None:
+            return self.m2
+        return self.m2 / self.count if self.count > 1 else 0.0
+
+    @property
+    def std(self) -> float:
+        return math.sqrt(self.variance)
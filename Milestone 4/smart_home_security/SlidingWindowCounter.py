@@ -0,0 +1,58 @@
+from bisect import insort
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from typing import Deque, Dict, Hashable, Optional
+
+_EPOCH = datetime(1970, 1, 1)
+_EPOCH_UTC = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_MICROSECOND = timedelta(microseconds=1)
+
+def to_epoch_us(timestamp: datetime) -> int:
+    """Microseconds since the Unix epoch (naive timestamps are used as they are)"""
+    epoch = _EPOCH if timestamp.tzinfo is None else _EPOCH_UTC
+    return (timestamp - epoch) // _MICROSECOND
+
+class SlidingWindowCounter:
+    def __init__(self, time_window: timedelta):
+        """
+        Counts events per key over a rolling time window.
+
+        Each key keeps a deque of event times in epoch microseconds, oldest
+        first. Adding an event appends it and pops the expired times from the
+        left, so every event costs amortized O(1) however full the window is.
+        """
+        self.time_window = time_window
+        self.window_us = time_window // _MICROSECOND
+        self.events: Dict[Hashable, Deque[int]] = {}
+
+    def add(self, key: Hashable, timestamp: datetime) -> int:
+        """Record an event and return the number of events of key within time_window of it"""
+        now = to_epoch_us(timestamp)
+        events = self.events.get(key)
+        if events is None:
+            events = self.events[key] = deque()
+
+        if not events or now >= events[-1]:
+            events.append(now)
+        else:
+            # Late events are rare; inserting them in place keeps the deque sorted
+            insort(events, now)
+
+        cutoff = now - self.window_us
+        while events[0] < cutoff:
+            events.popleft()
+        return len(events)
+
+    def count(self, key: Hashable) -> int:
+        """Number of events of key in the window as of its latest event"""
+        events = self.events.get(key)
+        return len(events) if events else 0
+
+    def get(self, key: Hashable, default: Optional[Deque[int]] = None) -> Optional[Deque[int]]:
+        return self.events.get(key, default)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self.events
+
+    def __len__(self) -> int:
+        return len(self.events)
@@ -0,0 +1,66 @@
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+class TTLCache:
+    def __init__(self, capacity: int, ttl: float, clock: Callable[[], float] = time.monotonic):
+        """
+        Bounded least-recently-used cache whose entries expire.
+
+        - capacity: maximum number of entries, the least recently used is
+          evicted first (0 disables the cache)
+        - ttl: default lifetime of an entry in seconds
+        - clock: source of the current time in seconds
+        """
+        self.capacity = capacity
+        self.ttl = ttl
+        self.clock = clock
+        # key -> (expires_at, value), least recently used first
+        self.entries: "OrderedDict[Hashable, tuple[float, Any]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+        if entry[0] <= self.clock():
+            del self.entries[key]
+            self.expired += 1
+            self.misses += 1
+            return default
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        """Store value under key for ttl seconds (the cache's ttl by default)"""
+        if self.capacity <= 0:
+            return
+        self.entries[key] = (self.clock() + (self.ttl if ttl is None else ttl), value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self.entries),
+            "capacity": self.capacity,
+            "hits": self.hits,
+            "misses": self.misses,
+            "expired": self.expired,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
+
+    def __contains__(self, key: Hashable) -> bool:
+        entry = self.entries.get(key)
+        return entry is not None and entry[0] > self.clock()
+
+    def __len__(self) -> int:
+        return len(self.entries)
@@ -0,0 +1,116 @@
+from collections import deque
+from datetime import datetime, timedelta
+from math import radians, sin, cos, sqrt, atan2, pi
+from typing import Deque, Dict, Hashable, List, Optional, Sequence, Tuple
+
+from smart_home_security.SlidingWindowCounter import to_epoch_us
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional, distances are then computed one at a time
+    np = None
+
+EARTH_RADIUS_KM = 6371.0
+# Histories at least this long have their distances computed with NumPy
+VECTORIZE_MIN_POINTS = 32
+_US_PER_HOUR = 3600 * 10**6
+
+# (epoch microseconds, latitude, longitude)
+Point = Tuple[int, float, float]
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Calculate distance between two points in km (Haversine formula)"""
+    lat1, lon1, lat2, lon2 = map(radians, [lat1, lon1, lat2, lon2])
+    dlat = lat2 - lat1
+    dlon = lon2 - lon1
+
+    a = sin(dlat/2)**2 + cos(lat1) * cos(lat2) * sin(dlon/2)**2
+    c = 2 * atan2(sqrt(a), sqrt(1-a))
+
+    return EARTH_RADIUS_KM * c
+
+def haversine_km_many(lats: Sequence[float], lons: Sequence[float], lat: float, lon: float) -> "np.ndarray":
+    """Distances in km from every point (lats[i], lons[i]) to (lat, lon), vectorized with NumPy"""
+    lats = np.radians(np.asarray(lats, dtype=float))
+    lons = np.radians(np.asarray(lons, dtype=float))
+    lat, lon = radians(lat), radians(lon)
+
+    a = np.sin((lat - lats) / 2)**2 + np.cos(lats) * cos(lat) * np.sin((lon - lons) / 2)**2
+    a = np.clip(a, 0.0, 1.0)  # Rounding can push a just outside [0, 1]
+    return EARTH_RADIUS_KM * 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+class TravelHistory:
+    def __init__(self, max_speed_kmh: float, horizon: timedelta = timedelta(hours=24), max_points: int = 256):
+        """
+        Recent login locations per key for the impossible-travel check.
+
+        A point is only kept while a later login could still be too far from
+        it to have travelled in time. Once a newer login was reachable from
+        it, every place too far from the old point is also too far from the
+        newer one (triangle inequality), so the old point is dropped. So are
+        points older than the horizon or than the time needed to cross half
+        the Earth. A user who logs in from plausible places keeps a single
+        point; the deque holding the points never grows past max_points.
+        """
+        self.max_speed_kmh = max_speed_kmh
+        self.horizon = min(horizon, timedelta(hours=pi * EARTH_RADIUS_KM / max_speed_kmh))
+        self.horizon_us = self.horizon // timedelta(microseconds=1)
+        self.max_points = max_points
+        self.points: Dict[Hashable, Deque[Point]] = {}
+
+    def get(self, key: Hashable) -> Deque[Point]:
+        """Points of key, oldest first"""
+        points = self.points.get(key)
+        if not isinstance(points, deque) or points.maxlen != self.max_points:
+            # Histories assigned from outside may be lists of (datetime, lat, lon)
+            points = self.points[key] = deque(
+                ((to_epoch_us(t) if isinstance(t, datetime) else t, lat, lon) for t, lat, lon in points or ()),
+                maxlen=self.max_points
+            )
+        return points
+
+    def distances(self, points: Sequence[Point], lat: float, lon: float) -> List[float]:
+        """Distance in km from every point to (lat, lon)"""
+        if np is not None and len(points) >= VECTORIZE_MIN_POINTS:
+            return haversine_km_many([p[1] for p in points], [p[2] for p in points], lat, lon).tolist()
+        return [haversine_km(p_lat, p_lon, lat, lon) for _, p_lat, p_lon in points]
+
+    def check(self, key: Hashable, timestamp: datetime, lat: float,
+              lon: float) -> Optional[Tuple[float, float, float]]:
+        """
+        Record a login of key and compare it with the earlier ones.
+
+        Returns (distance km, hours, speed km/h) from the oldest earlier point
+        that is too far away to have been reached in time, or None.
+        """
+        now = to_epoch_us(timestamp)
+        points = self.get(key)
+        violation = None
+        kept = []
+
+        for point, distance in zip(points, self.distances(points, lat, lon)):
+            elapsed = now - point[0]
+            if elapsed >= self.horizon_us:
+                continue
+            if elapsed <= 0:
+                # Same or later timestamps are not checked, and only an identical login replaces them
+                if elapsed < 0 or distance > 0:
+                    kept.append(point)
+                continue
+
+            hours = elapsed / _US_PER_HOUR
+            speed = distance / hours
+            if speed > self.max_speed_kmh:
+                if violation is None:
+                    violation = (distance, hours, speed)
+                kept.append(point)
+
+        kept.append((now, lat, lon))
+        self.points[key] = deque(kept, maxlen=self.max_points)
+        return violation
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self.points
+
+    def __len__(self) -> int:
+        return len(self.points)
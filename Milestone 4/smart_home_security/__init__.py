@@ -1,6 +1,10 @@
 from .AttackDetector import AttackDetector
 from .EventLogger import EventLogger
+from .RunningStats import RunningStats
+from .SlidingWindowCounter import SlidingWindowCounter
+from .TTLCache import TTLCache
+from .TravelHistory import TravelHistory
 
-__all__ = ['AttackDetector', 'EventLogger']
+__all__ = ['AttackDetector', 'EventLogger', 'RunningStats', 'SlidingWindowCounter', 'TTLCache', 'TravelHistory']
 
 __version__ = '1.0.0'
\ No newline at end of file
@@ -1,6 +1,8 @@
-from typing import Dict, List, Optional, Tuple, Any
+from typing import Dict, Optional, Tuple, Any
 from datetime import datetime, timedelta
 
+from smart_home_security.SlidingWindowCounter import SlidingWindowCounter
+
 class FailedLoginDetector:
     def __init__(self, threshold: int = 5, time_window: timedelta = timedelta(minutes=1)):
         """
@@ -10,26 +12,17 @@ class FailedLoginDetector:
         """
         self.threshold = threshold
         self.time_window = time_window
-        self.failed_attempts: Dict[str, List[datetime]] = {}
+        self.failed_attempts = SlidingWindowCounter(time_window)
 
     def detect(self, username: str, timestamp: datetime) -> Tuple[bool, Optional[str]]:
         """Record a failed login attempt and check if threshold is exceeded"""
-        if username not in self.failed_attempts:
-            self.failed_attempts[username] = []
-
-        # Add current attempt
-        self.failed_attempts[username].append(timestamp)
-
-        # Remove attempts outside the time window
-        self.failed_attempts[username] = [
-            attempt for attempt in self.failed_attempts[username]
-            if timestamp - attempt <= self.time_window
-        ]
+        # Add current attempt; attempts outside the time window are dropped
+        attempt_count = self.failed_attempts.add(username, timestamp)
 
         # Check if threshold exceeded
-        if len(self.failed_attempts[username]) > self.threshold:
+        if attempt_count > self.threshold:
             return True, (
-                f"User {username} has {len(self.failed_attempts[username])} "
+                f"User {username} has {attempt_count} "
                 f"failed login attempts in the last {self.time_window.seconds//60} minutes"
             )
 
@@ -40,7 +33,7 @@ class FailedLoginDetector:
             "timestamp": timestamp,
             "event": "failed_login_anomaly",
             "user_id": username,
-            "attempt_count": len(self.failed_attempts.get(username, [])),
+            "attempt_count": self.failed_attempts.count(username),
             "time_window_minutes": self.time_window.seconds // 60,
             "message": message
         }
\ No newline at end of file
@@ -1,15 +1,37 @@
-from typing import Dict, Optional, Tuple, List, Set, Any
+from typing import Deque, Dict, Optional, Tuple, Set, Any
 from datetime import datetime, timedelta
 import geoip2.database
+import geoip2.errors
 import ipaddress
 
+from smart_home_security.TTLCache import TTLCache
+from smart_home_security.TravelHistory import TravelHistory, haversine_km
+
+# How the GeoIP database is opened: "mmap" maps the file and lets the OS page
+# it in, "memory" reads it all into RAM up front, "mmap_ext" uses the
+# libmaxminddb C extension, "auto" picks the C extension if it is installed
+GEOIP_MODES = {
+    "auto": geoip2.database.MODE_AUTO,
+    "mmap_ext": geoip2.database.MODE_MMAP_EXT,
+    "mmap": geoip2.database.MODE_MMAP,
+    "file": geoip2.database.MODE_FILE,
+    "memory": geoip2.database.MODE_MEMORY
+}
+
 class GeoAnomalyDetector:
     def __init__(self, 
                  max_speed_kmh: float = 900,  # Commercial airliner speed
                  geoip_db_path: str = 'smart_home_security/detectors/GeoLite2-City.mmdb',
                  blacklist_countries: Set[str] = None,
                  tor_exit_nodes: Set[str] = None,
-                 mock_locations: Dict[str, Tuple[float, float, str]] = None):
+                 mock_locations: Dict[str, Tuple[float, float, str]] = None,
+                 geoip_mode: str = "auto",
+                 cache_size: int = 10000,
+                 cache_ttl: timedelta = timedelta(hours=24),
+                 negative_cache_ttl: timedelta = timedelta(hours=1),
+                 ipv4_prefix: Optional[int] = None,
+                 ipv6_prefix: Optional[int] = None,
+                 max_history: int = 256):
         """
         Initialize detector with:
         - max_speed_kmh: maximum plausible travel speed (km/h)
@@ -17,13 +39,29 @@ class GeoAnomalyDetector:
         - blacklist_countries: set of country codes to block
         - tor_exit_nodes: set of known TOR exit node IPs
         - mock_locations: dict of IP -> (lat, lon, country) for testing
+        - geoip_mode: how the database is opened, a key of GEOIP_MODES
+        - cache_size: number of IP lookups remembered (0 disables the cache)
+        - cache_ttl: how long a found location is reused
+        - negative_cache_ttl: how long an IP without a location is remembered
+        - ipv4_prefix / ipv6_prefix: cache by network (e.g. 24 / 64) instead of
+          by address, so every address of a household shares one lookup
+        - max_history: most locations kept per user for the travel check
         """
+        if geoip_mode not in GEOIP_MODES:
+            raise ValueError(f"Unknown GeoIP mode {geoip_mode!r}, expected one of {', '.join(GEOIP_MODES)}")
         self.max_speed_kmh = max_speed_kmh
-        self.geoip_reader = geoip2.database.Reader(geoip_db_path)
+        self.geoip_reader = geoip2.database.Reader(geoip_db_path, mode=GEOIP_MODES[geoip_mode])
+        self.location_cache = TTLCache(cache_size, cache_ttl.total_seconds())
+        self.negative_cache_ttl = negative_cache_ttl.total_seconds()
+        self.ipv4_prefix = ipv4_prefix
+        self.ipv6_prefix = ipv6_prefix
         self.blacklist_countries = blacklist_countries or set()
         self.tor_exit_nodes = tor_exit_nodes or set()
         self.mock_locations = mock_locations or {}
-        self.user_locations: Dict[str, List[Tuple[datetime, float, float]]] = {}
+        self.travel_history = TravelHistory(max_speed_kmh, max_points=max_history)
+        # user -> (epoch microseconds, lat, lon) of the logins that can still
+        # reveal impossible travel; a list of (datetime, lat, lon) may be assigned
+        self.user_locations: Dict[str, Deque[Tuple[int, float, float]]] = self.travel_history.points
     
     def _get_location(self, ip_address: str) -> Tuple[Optional[float], Optional[float], Optional[str]]:
         """Get (lat, lon, country_code) from IP address"""
@@ -31,28 +69,45 @@ class GeoAnomalyDetector:
         if ip_address in self.mock_locations:
             return self.mock_locations[ip_address]
         
+        key = self._cache_key(ip_address)
+        location = self.location_cache.get(key)
+        if location is not None:
+            return location
+        
         try:
             response = self.geoip_reader.city(ip_address)
-            return (response.location.latitude, 
+        except (geoip2.errors.AddressNotFoundError, ValueError):
+            # Unknown and malformed addresses stay that way, so remember them too
+            location = (None, None, None)
+            self.location_cache.put(key, location, ttl=self.negative_cache_ttl)
+            return location
+        
+        location = (response.location.latitude, 
                     response.location.longitude, 
                     response.country.iso_code)
-        except:
-            return None, None, None
+        self.location_cache.put(key, location)
+        return location
+    
+    def _cache_key(self, ip_address: str) -> str:
+        """Cache key of an IP: the address itself, or its network when a prefix is set"""
+        if self.ipv4_prefix is None and self.ipv6_prefix is None:
+            return ip_address
+        try:
+            address = ipaddress.ip_address(ip_address)
+        except ValueError:
+            return ip_address
+        prefix = self.ipv4_prefix if address.version == 4 else self.ipv6_prefix
+        if prefix is None:
+            return str(address)
+        return str(ipaddress.ip_network((address, prefix), strict=False))
+    
+    def cache_stats(self) -> Dict[str, Any]:
+        """Size, hits, misses and hit rate of the location cache"""
+        return self.location_cache.stats()
     
     def _calculate_distance(self, lat1: float, lon1: float, lat2: float, lon2: float) -> float:
         """Calculate distance between two points in km (Haversine formula)"""
-        from math import radians, sin, cos, sqrt, atan2
-        
-        R = 6371.0  # Earth radius in km
-        
-        lat1, lon1, lat2, lon2 = map(radians, [lat1, lon1, lat2, lon2])
-        dlat = lat2 - lat1
-        dlon = lon2 - lon1
-        
-        a = sin(dlat/2)**2 + cos(lat1) * cos(lat2) * sin(dlon/2)**2
-        c = 2 * atan2(sqrt(a), sqrt(1-a))
-        
-        return R * c
+        return haversine_km(lat1, lon1, lat2, lon2)
     
     def detect(self, user_id: str, ip_address: str, timestamp: datetime) -> Tuple[bool, Optional[str]]:
         """Detect geographic anomalies"""
@@ -71,39 +126,15 @@ class GeoAnomalyDetector:
         if curr_lat is None or curr_lon is None:
             return False, None
         
-        # Initialize user location history if needed
-        if user_id not in self.user_locations:
-            self.user_locations[user_id] = []
-        
-        # Check for impossible travel
-        anomaly_detected = False
-        message = None
-        
-        for prev_time, prev_lat, prev_lon in self.user_locations[user_id]:
-            time_diff = (timestamp - prev_time).total_seconds() / 3600  # hours
-            if time_diff <= 0:
-                continue  # Skip same or future timestamps
-            
-            distance = self._calculate_distance(prev_lat, prev_lon, curr_lat, curr_lon)
-            speed = distance / time_diff  # km/h
-            
-            if speed > self.max_speed_kmh:
-                anomaly_detected = True
-                message = (f"Impossible travel detected for {user_id}: "
-                         f"{distance:.1f} km in {time_diff*60:.1f} minutes "
-                         f"(speed: {speed:.1f} km/h)")
-                break
-        
-        # Add current location to history
-        self.user_locations[user_id].append((timestamp, curr_lat, curr_lon))
-        
-        # Keep only recent locations (last 24 hours)
-        self.user_locations[user_id] = [
-            loc for loc in self.user_locations[user_id]
-            if (timestamp - loc[0]) < timedelta(hours=24)
-        ]
+        # Check for impossible travel and add current location to history
+        violation = self.travel_history.check(user_id, timestamp, curr_lat, curr_lon)
+        if violation is None:
+            return False, None
         
-        return anomaly_detected, message
+        distance, time_diff, speed = violation
+        return True, (f"Impossible travel detected for {user_id}: "
+                      f"{distance:.1f} km in {time_diff*60:.1f} minutes "
+                      f"(speed: {speed:.1f} km/h)")
     
     def get_event_data(self, user_id: str, ip_address: str, timestamp: str, 
                       message: str) -> Dict[str, Any]:
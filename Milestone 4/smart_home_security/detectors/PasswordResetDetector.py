@@ -1,6 +1,8 @@
-from typing import Dict, List, Optional, Any
+from typing import Dict, Optional, Any
 from datetime import datetime, timedelta
 
+from smart_home_security.SlidingWindowCounter import SlidingWindowCounter
+
 class PasswordResetDetector:
     def __init__(self, threshold: int = 3, time_window: int = 5):
         """
@@ -10,27 +12,17 @@ class PasswordResetDetector:
         """
         self.threshold = threshold
         self.time_window = timedelta(minutes=time_window)
-        self.reset_attempts: Dict[str, List[datetime]] = {}
+        self.reset_attempts = SlidingWindowCounter(self.time_window)
     
     def detect(self, user_id: str, timestamp: datetime) -> tuple[bool, Optional[str]]:
         """Detect frequent password reset attempts"""
-        if user_id not in self.reset_attempts:
-            self.reset_attempts[user_id] = []
-        
-        # Add current attempt
-        self.reset_attempts[user_id].append(timestamp)
-        
-        # Filter attempts within time window
-        recent_attempts = [
-            attempt for attempt in self.reset_attempts[user_id]
-            if timestamp - attempt <= self.time_window
-        ]
-        self.reset_attempts[user_id] = recent_attempts
+        # Add current attempt; attempts outside the time window are dropped
+        recent_attempts = self.reset_attempts.add(user_id, timestamp)
         
         # Check if threshold exceeded
-        if len(recent_attempts) > self.threshold:
+        if recent_attempts > self.threshold:
             return True, (
-                f"User {user_id} made {len(recent_attempts)} password reset attempts "
+                f"User {user_id} made {recent_attempts} password reset attempts "
                 f"in the last {self.time_window.seconds//60} minutes"
             )
         
@@ -41,7 +33,7 @@ class PasswordResetDetector:
             "timestamp": timestamp,
             "event": "password_reset_anomaly",
             "user_id": user_id,
-            "attempt_count": len(self.reset_attempts.get(user_id, [])),
+            "attempt_count": self.reset_attempts.count(user_id),
             "time_window_minutes": self.time_window.seconds // 60,
             "message": message
         }
\ No newline at end of file
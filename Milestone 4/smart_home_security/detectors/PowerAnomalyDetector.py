@@ -1,24 +1,46 @@
-from typing import Dict, List, Optional, Any
+from typing import Dict, Optional, Any
+
+from smart_home_security.RunningStats import RunningStats
 
 class PowerAnomalyDetector:
-    def __init__(self, spike_threshold: float = 1.5):
+    def __init__(self, spike_threshold: float = 1.5, window: Optional[int] = None,
+                 z_threshold: Optional[float] = None, min_readings: int = 10):
+        """
+        Initialize detector with:
+        - spike_threshold: flag readings above this multiple of the average (default 150%)
+        - window: None averages every reading; a number weights the most recent
+          `window` readings (EWMA) so the average follows a changing load
+        - z_threshold: also flag readings more than this many standard
+          deviations above the average of the earlier readings (default off)
+        - min_readings: readings needed before the average is used (default 10)
+
+        Only a running mean and variance are kept per device, so memory and
+        time per reading are constant.
+        """
         self.spike_threshold = spike_threshold  # 150% of average
-        self.power_readings: Dict[str, List[float]] = {}
+        self.window = window
+        self.z_threshold = z_threshold
+        self.min_readings = min_readings
+        self.power_stats: Dict[str, RunningStats] = {}
         self.power_averages: Dict[str, float] = {}
-    
+
     def detect(self, device_id: str, value: float) -> tuple[bool, Optional[str]]:
         """Detect abnormal power consumption"""
-        if device_id not in self.power_readings:
-            self.power_readings[device_id] = []
-        
-        self.power_readings[device_id].append(value)
-        
+        stats = self.power_stats.get(device_id)
+        if stats is None:
+            stats = self.power_stats[device_id] = RunningStats(self.window)
+
+        # The z-score compares the reading with the readings before it
+        z_score = None
+        if self.z_threshold is not None and stats.count >= self.min_readings and stats.std > 0:
+            z_score = (value - stats.mean) / stats.std
+
+        stats.update(value)
+
         # Update average if we have enough data (minimum 10 readings)
-        if len(self.power_readings[device_id]) >= 10:
-            self.power_averages[device_id] = (
-                sum(self.power_readings[device_id]) / len(self.power_readings[device_id])
-            )
-        
+        if stats.count >= self.min_readings:
+            self.power_averages[device_id] = stats.mean
+
         # Check for anomalies
         if value <= 0:
             return True, f"Negative/zero power reading for device {device_id}"
@@ -27,9 +49,14 @@ class PowerAnomalyDetector:
                 f"Power spike detected for device {device_id} "
                 f"(value: {value}, avg: {self.power_averages[device_id]:.2f})"
             )
-        
+        elif z_score is not None and z_score > self.z_threshold:
+            return True, (
+                f"Unusual power reading for device {device_id} "
+                f"(value: {value}, z-score: {z_score:.2f})"
+            )
+
         return False, None
-    
+
     def get_event_data(self, device_id: str, value: float, timestamp: str, message: str) -> Dict[str, Any]:
         return {
             "timestamp": timestamp,
@@ -38,4 +65,4 @@ class PowerAnomalyDetector:
             "value": value,
             "average": self.power_averages.get(device_id, None),
             "message": message
-        }
\ No newline at end of file
+        }
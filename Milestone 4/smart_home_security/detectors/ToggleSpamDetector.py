@@ -1,5 +1,7 @@
 from datetime import datetime, timedelta
-from typing import Dict, List, Tuple, Optional, Any
+from typing import Dict, Tuple, Optional, Any
+
+from smart_home_security.SlidingWindowCounter import SlidingWindowCounter
 
 class ToggleSpamDetector:
     def __init__(
@@ -16,26 +18,17 @@ class ToggleSpamDetector:
         """
         self.threshold = threshold
         self.time_window = time_window
-        self.command_history: Dict[str, List[datetime]] = {}  # {device_id: [timestamps]}
+        self.command_history = SlidingWindowCounter(time_window)  # {device_id: recent timestamps}
 
     def detect(self, device_id: str, timestamp: datetime) -> Tuple[bool, Optional[str]]:
         """Record a toggle command and check for spam"""
-        if device_id not in self.command_history:
-            self.command_history[device_id] = []
-
-        # Add current command
-        self.command_history[device_id].append(timestamp)
-
-        # Purge old entries outside time window
-        self.command_history[device_id] = [
-            t for t in self.command_history[device_id]
-            if timestamp - t <= self.time_window
-        ]
+        # Add current command; entries outside the time window are purged
+        command_count = self.command_history.add(device_id, timestamp)
 
         # Check threshold
-        if len(self.command_history[device_id]) > self.threshold:
+        if command_count > self.threshold:
             return True, (
-                f"Device {device_id} has {len(self.command_history[device_id])} "
+                f"Device {device_id} has {command_count} "
                 f"toggle commands in the last {self.time_window.total_seconds()} seconds"
             )
         return False, None
@@ -45,7 +38,7 @@ class ToggleSpamDetector:
             "timestamp": timestamp,
             "event": "toggle_spam",
             "device_id": device_id,
-            "count": len(self.command_history.get(device_id, [])),
+            "count": self.command_history.count(device_id),
             "time_window_seconds": self.time_window.total_seconds(),
             "message": message
         }
\ No newline at end of file
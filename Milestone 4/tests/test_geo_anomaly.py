@@ -1,5 +1,8 @@
 import unittest
 from datetime import datetime, timedelta
+from types import SimpleNamespace
+from unittest import mock
+import geoip2.errors
 from smart_home_security.detectors.GeoAnomalyDetector import GeoAnomalyDetector
 from smart_home_security import AttackDetector
 
@@ -56,6 +59,73 @@ class TestGeoAnomalyDetector(unittest.TestCase):
         is_anomaly, _ = self.detector.detect("user5", "8.8.8.8", self.now)
         self.assertFalse(is_anomaly)
 
+class FakeReader:
+    """Stands in for geoip2.database.Reader and counts the lookups"""
+    def __init__(self, locations):
+        self.locations = locations
+        self.lookups = 0
+
+    def city(self, ip_address):
+        self.lookups += 1
+        if ip_address not in self.locations:
+            raise geoip2.errors.AddressNotFoundError(f"{ip_address} is not in the database")
+        lat, lon, country = self.locations[ip_address]
+        return SimpleNamespace(location=SimpleNamespace(latitude=lat, longitude=lon),
+                               country=SimpleNamespace(iso_code=country))
+
+class TestGeoLocationCache(unittest.TestCase):
+    def setUp(self):
+        self.reader = FakeReader({
+            '8.8.8.8': (37.5, -122.3, 'US'),
+            '203.0.113.7': (51.5, -0.1, 'GB')
+        })
+        patcher = mock.patch('geoip2.database.Reader', return_value=self.reader)
+        self.reader_class = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.now = datetime.now()
+
+    def test_repeated_ip_is_looked_up_once(self):
+        detector = GeoAnomalyDetector()
+        for i in range(5):
+            detector.detect("user1", "8.8.8.8", self.now + timedelta(minutes=i))
+
+        self.assertEqual(self.reader.lookups, 1)
+        stats = detector.cache_stats()
+        self.assertEqual(stats["hits"], 4)
+        self.assertEqual(stats["misses"], 1)
+
+    def test_unknown_ip_is_cached(self):
+        detector = GeoAnomalyDetector()
+        for i in range(3):
+            is_anomaly, _ = detector.detect("user1", "192.0.2.1", self.now)
+            self.assertFalse(is_anomaly)
+        detector.detect("user1", "not an ip", self.now)
+        detector.detect("user1", "not an ip", self.now)
+
+        self.assertEqual(self.reader.lookups, 2)
+
+    def test_negative_entries_expire_first(self):
+        detector = GeoAnomalyDetector(cache_ttl=timedelta(hours=24), negative_cache_ttl=timedelta(0))
+        detector.detect("user1", "192.0.2.1", self.now)
+        detector.detect("user1", "192.0.2.1", self.now)
+
+        self.assertEqual(self.reader.lookups, 2)
+
+    def test_network_prefix_shares_entry(self):
+        detector = GeoAnomalyDetector(ipv4_prefix=24)
+        detector.detect("user1", "203.0.113.7", self.now)
+        detector.detect("user2", "203.0.113.99", self.now)
+
+        self.assertEqual(self.reader.lookups, 1)
+        self.assertEqual(detector._cache_key("203.0.113.99"), "203.0.113.0/24")
+        self.assertEqual(detector._cache_key("2001:db8::1"), "2001:db8::1")
+
+    def test_geoip_mode(self):
+        GeoAnomalyDetector(geoip_mode="memory")
+        self.assertEqual(self.reader_class.call_args.kwargs["mode"], geoip2.database.MODE_MEMORY)
+        with self.assertRaises(ValueError):
+            GeoAnomalyDetector(geoip_mode="bogus")
+
 class TestGeoIntegration(unittest.TestCase):    
     def setUp(self):
         self.detector = AttackDetector()
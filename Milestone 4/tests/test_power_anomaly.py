@@ -28,6 +28,51 @@ class TestPowerAnomalyDetector(unittest.TestCase):
         self.assertTrue(is_anomaly)
         self.assertIn("negative", msg.lower())
 
+    def test_no_spike_during_warm_up(self):
+        for i in range(8):
+            self.detector.detect("device1", 100.0)
+
+        is_anomaly, _ = self.detector.detect("device1", 1000.0)
+        self.assertFalse(is_anomaly)
+        self.assertNotIn("device1", self.detector.power_averages)
+
+    def test_average_matches_full_history(self):
+        readings = [100.0, 110.0, 90.0, 105.0, 95.0, 100.0, 102.0, 98.0, 101.0, 99.0, 104.0, 96.0]
+        for value in readings:
+            self.detector.detect("device1", value)
+
+        self.assertAlmostEqual(self.detector.power_averages["device1"], sum(readings) / len(readings))
+
+    def test_constant_memory_per_device(self):
+        for i in range(1000):
+            self.detector.detect("device1", 100.0 + i % 7)
+
+        self.assertEqual(self.detector.power_stats["device1"].count, 1000)
+        self.assertFalse(hasattr(self.detector, "power_readings"))
+
+    def test_window_follows_new_load(self):
+        detector = PowerAnomalyDetector(spike_threshold=1.5, window=20)
+        for i in range(50):
+            detector.detect("device1", 100.0)
+        for i in range(100):
+            detector.detect("device1", 200.0)
+
+        # With every reading averaged 250 would be a spike; the windowed average is ~200
+        is_anomaly, _ = detector.detect("device1", 250.0)
+        self.assertFalse(is_anomaly)
+
+    def test_z_score_detection(self):
+        detector = PowerAnomalyDetector(spike_threshold=1.5, z_threshold=3.0)
+        for i in range(20):
+            detector.detect("device1", 100.0 + (i % 2) * 2)
+
+        is_anomaly, _ = detector.detect("device1", 102.0)
+        self.assertFalse(is_anomaly)
+        # Well below the 150% spike threshold, but far outside the usual spread
+        is_anomaly, msg = detector.detect("device1", 120.0)
+        self.assertTrue(is_anomaly)
+        self.assertIn("z-score", msg)
+
 #integration tests for PowerAnomalyDetector with AttackDetector
 class TestPowerIntegration(unittest.TestCase):    
     def setUp(self):
@@ -0,0 +1,39 @@
+import math
+import statistics
+import unittest
+from smart_home_security import RunningStats
+
+class TestRunningStats(unittest.TestCase):
+    def setUp(self):
+        self.values = [100.0, 102.5, 98.0, 130.0, 95.5, 101.0, 99.0, 250.0, 97.0, 103.0]
+
+    def test_welford_matches_full_history(self):
+        stats = RunningStats()
+        for value in self.values:
+            stats.update(value)
+        self.assertEqual(stats.count, len(self.values))
+        self.assertAlmostEqual(stats.mean, statistics.fmean(self.values))
+        self.assertAlmostEqual(stats.variance, statistics.pvariance(self.values))
+        self.assertAlmostEqual(stats.std, math.sqrt(statistics.pvariance(self.values)))
+
+    def test_single_value_has_no_variance(self):
+        stats = RunningStats()
+        stats.update(42.0)
+        self.assertEqual(stats.mean, 42.0)
+        self.assertEqual(stats.variance, 0.0)
+
+    def test_ewma_follows_recent_values(self):
+        stats = RunningStats(window=10)
+        for _ in range(50):
+            stats.update(100.0)
+        for _ in range(50):
+            stats.update(200.0)
+        self.assertAlmostEqual(stats.mean, 200.0, delta=0.1)
+        self.assertLess(stats.variance, 1.0)
+
+    def test_ewma_constant_input(self):
+        stats = RunningStats(window=5)
+        for _ in range(20):
+            stats.update(7.0)
+        self.assertEqual(stats.mean, 7.0)
+        self.assertEqual(stats.variance, 0.0)
@@ -0,0 +1,53 @@
+import unittest
+from datetime import datetime, timedelta, timezone
+from smart_home_security import SlidingWindowCounter
+
+class TestSlidingWindowCounter(unittest.TestCase):
+    def setUp(self):
+        self.counter = SlidingWindowCounter(timedelta(seconds=30))
+        self.now = datetime.now()
+
+    def test_counts_events_in_window(self):
+        for i in range(5):
+            count = self.counter.add("light1", self.now + timedelta(seconds=i))
+        self.assertEqual(count, 5)
+        self.assertEqual(self.counter.count("light1"), 5)
+
+    def test_expired_events_are_dropped(self):
+        for i in range(5):
+            self.counter.add("light1", self.now + timedelta(seconds=i))
+        count = self.counter.add("light1", self.now + timedelta(seconds=33))
+        # Events at 3s and 4s are still within 30 seconds of 33s
+        self.assertEqual(count, 3)
+        self.assertEqual(len(self.counter.get("light1")), 3)
+
+    def test_window_boundary_is_inclusive(self):
+        self.counter.add("light1", self.now)
+        count = self.counter.add("light1", self.now + timedelta(seconds=30))
+        self.assertEqual(count, 2)
+
+    def test_keys_are_independent(self):
+        self.counter.add("light1", self.now)
+        self.counter.add("light1", self.now)
+        self.counter.add("light2", self.now)
+        self.assertEqual(self.counter.count("light1"), 2)
+        self.assertEqual(self.counter.count("light2"), 1)
+        self.assertEqual(self.counter.count("light3"), 0)
+        self.assertIn("light2", self.counter)
+        self.assertNotIn("light3", self.counter)
+
+    def test_late_event_is_kept_in_order(self):
+        self.counter.add("light1", self.now + timedelta(seconds=10))
+        self.counter.add("light1", self.now + timedelta(seconds=20))
+        count = self.counter.add("light1", self.now + timedelta(seconds=15))
+        self.assertEqual(count, 3)
+        self.assertEqual(list(self.counter.get("light1")), sorted(self.counter.get("light1")))
+        # The late event expires in order with the others
+        count = self.counter.add("light1", self.now + timedelta(seconds=48))
+        self.assertEqual(count, 2)
+
+    def test_timezone_aware_timestamps(self):
+        now = datetime.now(timezone.utc)
+        self.counter.add("light1", now)
+        count = self.counter.add("light1", now + timedelta(seconds=31))
+        self.assertEqual(count, 1)
\ No newline at end of file
@@ -0,0 +1,86 @@
+import random
+import unittest
+from datetime import datetime, timedelta
+from smart_home_security import TravelHistory
+from smart_home_security.TravelHistory import haversine_km, np
+
+NEW_YORK = (40.7, -74.0)
+LONDON = (51.5, -0.1)
+PARIS = (48.9, 2.4)
+TOKYO = (35.7, 139.7)
+
+def full_history_check(logins, max_speed_kmh):
+    """The impossible-travel check against every login of the last 24 hours"""
+    results = []
+    for i, (timestamp, lat, lon) in enumerate(logins):
+        flagged = False
+        for prev_time, prev_lat, prev_lon in logins[:i]:
+            hours = (timestamp - prev_time).total_seconds() / 3600
+            if 0 < hours < 24 and haversine_km(prev_lat, prev_lon, lat, lon) / hours > max_speed_kmh:
+                flagged = True
+        results.append(flagged)
+    return results
+
+class TestTravelHistory(unittest.TestCase):
+    def setUp(self):
+        self.history = TravelHistory(max_speed_kmh=900)
+        self.now = datetime(2025, 1, 1, 12)
+
+    def test_plausible_travel_keeps_one_point(self):
+        self.assertIsNone(self.history.check("user1", self.now, *LONDON))
+        self.assertIsNone(self.history.check("user1", self.now + timedelta(hours=2), *PARIS))
+        self.assertIsNone(self.history.check("user1", self.now + timedelta(hours=3), *PARIS))
+        self.assertEqual(len(self.history.get("user1")), 1)
+
+    def test_impossible_travel(self):
+        self.history.check("user1", self.now, *NEW_YORK)
+        distance, hours, speed = self.history.check("user1", self.now + timedelta(minutes=10), *TOKYO)
+        self.assertGreater(distance, 10000)
+        self.assertAlmostEqual(hours * 60, 10)
+        self.assertGreater(speed, 900)
+        # Both logins stay, either one can expose the next
+        self.assertEqual(len(self.history.get("user1")), 2)
+
+    def test_horizon_is_time_to_cross_half_the_earth(self):
+        self.assertLess(self.history.horizon, timedelta(hours=24))
+        slow = TravelHistory(max_speed_kmh=100)
+        self.assertEqual(slow.horizon, timedelta(hours=24))
+
+        self.history.check("user1", self.now, *NEW_YORK)
+        self.history.check("user1", self.now + timedelta(minutes=10), *TOKYO)
+        self.history.check("user1", self.now + self.history.horizon, *TOKYO)
+        self.assertEqual(len(self.history.get("user1")), 1)
+
+    def test_assigned_list_is_converted(self):
+        self.history.points["user1"] = [(self.now - timedelta(minutes=10), *NEW_YORK)]
+        self.assertIsNotNone(self.history.check("user1", self.now, *TOKYO))
+
+    def test_history_is_bounded(self):
+        history = TravelHistory(max_speed_kmh=900, max_points=4)
+        # Places thousands of km apart a minute after each other, none can be dropped
+        for i in range(12):
+            history.check("user1", self.now + timedelta(minutes=i), 0.0, i * 30.0)
+        self.assertEqual(len(history.get("user1")), 4)
+
+    def test_matches_full_history(self):
+        rng = random.Random(4720)
+        places = [NEW_YORK, LONDON, PARIS, TOKYO, (52.5, 13.4), (48.1, 11.6)]
+        logins = []
+        timestamp = self.now
+        for i in range(300):
+            timestamp += timedelta(minutes=rng.choice([1, 30, 90, 300, 600]))
+            logins.append((timestamp, *rng.choice(places)))
+
+        expected = full_history_check(logins, 900)
+        self.assertTrue(any(expected) and not all(expected))
+        results = [self.history.check("user1", *login) is not None for login in logins]
+        self.assertEqual(results, expected)
+        self.assertLess(max(len(p) for p in self.history.points.values()), 10)
+
+    @unittest.skipIf(np is None, "NumPy is not installed")
+    def test_vectorized_distances(self):
+        rng = random.Random(1)
+        points = [(0, rng.uniform(-90, 90), rng.uniform(-180, 180)) for _ in range(100)]
+        expected = [haversine_km(lat, lon, *TOKYO) for _, lat, lon in points]
+        for distance, expected_distance in zip(self.history.distances(points, *TOKYO), expected):
+            self.assertAlmostEqual(distance, expected_distance, places=6)
@@ -0,0 +1,54 @@
+import unittest
+from smart_home_security import TTLCache
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+class TestTTLCache(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.cache = TTLCache(capacity=3, ttl=60, clock=self.clock)
+
+    def test_hit_and_miss(self):
+        self.cache.put("a", 1)
+        self.assertEqual(self.cache.get("a"), 1)
+        self.assertIsNone(self.cache.get("b"))
+        stats = self.cache.stats()
+        self.assertEqual(stats["hits"], 1)
+        self.assertEqual(stats["misses"], 1)
+        self.assertEqual(stats["hit_rate"], 0.5)
+
+    def test_entries_expire(self):
+        self.cache.put("a", 1)
+        self.clock.now = 59
+        self.assertEqual(self.cache.get("a"), 1)
+        self.clock.now = 60
+        self.assertIsNone(self.cache.get("a"))
+        self.assertNotIn("a", self.cache)
+        self.assertEqual(self.cache.stats()["expired"], 1)
+
+    def test_per_entry_ttl(self):
+        self.cache.put("short", 1, ttl=5)
+        self.cache.put("long", 2)
+        self.clock.now = 10
+        self.assertIsNone(self.cache.get("short"))
+        self.assertEqual(self.cache.get("long"), 2)
+
+    def test_least_recently_used_is_evicted(self):
+        for key in "abc":
+            self.cache.put(key, key)
+        self.cache.get("a")
+        self.cache.put("d", "d")
+        self.assertEqual(len(self.cache), 3)
+        self.assertIn("a", self.cache)
+        self.assertNotIn("b", self.cache)
+
+    def test_zero_capacity_disables_cache(self):
+        cache = TTLCache(capacity=0, ttl=60)
+        cache.put("a", 1)
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(len(cache), 0)